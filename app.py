@@ -1,11 +1,40 @@
-# app.py - COMPLETE SINGLE FILE SOLUTION
+# app.py - the Streamlit UI and shared inventory store for the drone lab: backends, live updates and
+# every page. Plumbing lives in the modules next to it - storage_io.py, backups.py, ledger.py,
+# search_index.py, bulk_io.py, compact_snapshot.py, qr_labels.py and diagnostics.py
 import streamlit as st
-import qrcode
-import io
+import copy
+import hashlib
+import heapq
+import hmac
 import json
+import logging
 import os
-from datetime import datetime
+import re
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import threading
+import time
 import uuid
+from urllib.parse import urlencode
+
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+import compact_snapshot
+from backups import Backups, entry_time
+from diagnostics import Diagnostics
+from ledger import Ledger
+from search_index import InventoryIndex
+from storage_io import connect_sqlite, file_lock, write_atomic
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # no file-system events - the change watcher polls instead
+    Observer = None
+
+logger = logging.getLogger(__name__)  # errors off the request path, where st.error has no session to show them
 
 # Set page config FIRST - before any other Streamlit commands
 st.set_page_config(
@@ -14,45 +43,88 @@ st.set_page_config(
     layout="wide"
 )
 
+# DIAGNOSTICS - timing spans and counters on the hot paths, collected only while switched on
+ADMIN_KEY = os.environ.get('INVENTORY_ADMIN_KEY')  # unlocks the admin views; unset disables them
+DIAGNOSTICS_FILE = os.environ.get('INVENTORY_DIAGNOSTICS_FILE')  # *.json, else Prometheus text
+DIAGNOSTICS_EXPORT_INTERVAL = 15  # seconds between rewrites of DIAGNOSTICS_FILE
+
+@st.cache_resource
+def get_diagnostics():
+    """Process-wide collector - on from the start with INVENTORY_DIAGNOSTICS=1 or an export file"""
+    collector = Diagnostics(enabled=os.environ.get('INVENTORY_DIAGNOSTICS') == '1' or bool(DIAGNOSTICS_FILE))
+    if DIAGNOSTICS_FILE:
+        collector.start_export(DIAGNOSTICS_FILE, DIAGNOSTICS_EXPORT_INTERVAL)
+    return collector
+
+diagnostics = get_diagnostics()
+rerun_started = time.perf_counter()
+
+# Views a rerun is timed under - anything else, such as a made-up ?view=, counts as 'other'
+RERUN_VIEWS = frozenset({'storage_scan', 'dashboard', 'add_storage', 'edit_storage', 'add_item', 'edit_item',
+                         'import_export', 'history', 'diagnostics', 'backups', 'labs'})
+
+def finish_rerun(view):
+    """Record this script run's latency under the view it rendered"""
+    view = view if view in RERUN_VIEWS else 'other'
+    diagnostics.observe(f"rerun.{view}", time.perf_counter() - rerun_started)
+
 # DATA PERSISTENCE FUNCTIONS
 DATA_FILE = "inventory_data.json"
+DB_FILE = "inventory_data.db"
+LEDGER_FILE = "inventory_ledger.db"  # item status/move history, whichever backend holds the inventory
+JOURNAL_COMPACT_THRESHOLD = 500  # journal entries before they are folded into the snapshot
+CHANGE_LOG_KEEP = 1000  # SQLite change-feed rows kept for catching up other processes
+COMPACT_FILE = "inventory_data.snap"  # msgpack snapshot of the 'compact' backend
+STORAGE_BACKEND = os.environ.get('INVENTORY_BACKEND', 'json')  # 'json', 'compact' or 'sqlite'
 
-def load_inventory():
-    """Load inventory from JSON file - ROBUST VERSION"""
-    try:
-        if os.path.exists(DATA_FILE):
-            with open(DATA_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                # Validate and repair data structure
-                if 'storages' not in data:
-                    data['storages'] = {}
-                return data
-        return get_default_inventory()
-    except Exception as e:
-        st.error(f"Data loading error: {e}")
-        return get_default_inventory()
+# LABS - every lab (tenant) has its own data shard, settings, QR URLs, caches and locks
+DEFAULT_LAB = 'main'  # keeps its files in the app directory, as before there were labs
+LABS_DIR = "labs"  # labs/<lab>/ holds another lab's data files and its lab.json settings
+LAB_ID = re.compile(r'^[a-z0-9][a-z0-9_-]{0,31}$')
+LAB_SETTINGS = ('categories', 'status_options', 'storage_types', 'app_url')  # lab.json keys a new shard starts with
+
+def lab_dir(lab):
+    return '.' if lab == DEFAULT_LAB else os.path.join(LABS_DIR, lab)
+
+def lab_file(lab, name):
+    """Path of one of a lab's data files"""
+    return name if lab == DEFAULT_LAB else os.path.join(LABS_DIR, lab, name)
 
-def save_inventory(inventory):
-    """Save inventory to JSON file - ATOMIC OPERATION"""
+def lab_exists(lab):
+    return lab == DEFAULT_LAB or (bool(LAB_ID.match(lab)) and os.path.isdir(lab_dir(lab)))
+
+def list_labs():
+    """The default lab, then every lab directory"""
+    labs = sorted(name for name in os.listdir(LABS_DIR) if name != DEFAULT_LAB and lab_exists(name)) \
+        if os.path.isdir(LABS_DIR) else []
+    return [DEFAULT_LAB] + labs
+
+def get_lab_config(lab):
+    """A lab's lab.json - its display name and the settings its inventory starts with"""
     try:
-        # Create backup first
-        if os.path.exists(DATA_FILE):
-            backup_file = f"{DATA_FILE}.backup"
-            with open(DATA_FILE, 'r', encoding='utf-8') as src:
-                with open(backup_file, 'w', encoding='utf-8') as dst:
-                    dst.write(src.read())
-        
-        # Save new data
-        with open(DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(inventory, f, indent=2, ensure_ascii=False)
-        return True
-    except Exception as e:
-        st.error(f"Data saving error: {e}")
-        return False
+        with open(os.path.join(lab_dir(lab), 'lab.json'), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
-def get_default_inventory():
-    """Default inventory structure"""
-    return {
+def lab_query():
+    """Query parameters that keep a link inside the current lab"""
+    return {} if lab == DEFAULT_LAB else {'lab': lab}
+
+def get_lab_name(lab):
+    return get_lab_config(lab).get('name') or ('Drone Lab AIC' if lab == DEFAULT_LAB else lab)
+
+def create_lab(lab, name):
+    """New lab directory with its lab.json - the shard itself is created on first use"""
+    defaults = get_default_inventory()
+    os.makedirs(lab_dir(lab))
+    config = {'name': name, **{key: defaults[key] for key in LAB_SETTINGS}}
+    with open(os.path.join(lab_dir(lab), 'lab.json'), 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2, ensure_ascii=False)
+
+def get_default_inventory(lab=DEFAULT_LAB):
+    """Default inventory structure - other labs start empty, with their lab.json settings"""
+    data = {
         'storages': {
             'storage_1': {
                 'id': 'storage_1',
@@ -61,9 +133,9 @@ def get_default_inventory():
                 'location': 'Drone Lab AIC',
                 'description': 'Main storage for drone equipment',
                 'items': [
-                    {'id': 'item_1', 'name': 'DJI Mavic 3 Pro', 'quantity': '3 units', 'status': 'Available', 'category': 'Drones'},
-                    {'id': 'item_2', 'name': 'LiPo Batteries', 'quantity': '15 units', 'status': 'Available', 'category': 'Batteries'},
-                    {'id': 'item_3', 'name': 'FPV Controller', 'quantity': '2 units', 'status': 'In Use', 'category': 'Controllers'}
+                    {'id': 'item_1', 'name': 'DJI Mavic 3 Pro', 'count': 3, 'unit': 'units', 'min_stock': 1, 'status': 'Available', 'category': 'Drones'},
+                    {'id': 'item_2', 'name': 'LiPo Batteries', 'count': 15, 'unit': 'units', 'min_stock': 6, 'status': 'Available', 'category': 'Batteries'},
+                    {'id': 'item_3', 'name': 'FPV Controller', 'count': 2, 'unit': 'units', 'min_stock': 0, 'status': 'In Use', 'category': 'Controllers'}
                 ],
                 'last_updated': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             }
@@ -74,9 +146,1214 @@ def get_default_inventory():
         'app_url': 'https://drone-lab-inventory-l8phzdn3dqn38cppfacdtr.streamlit.app',
         'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
+    if lab != DEFAULT_LAB:
+        data['storages'] = {}
+    config = get_lab_config(lab)
+    data.update({key: config[key] for key in LAB_SETTINGS if key in config})
+    return data
+
+# ITEM QUANTITIES - numeric count + unit, with an optional reorder threshold
+# A comma before exactly three digits groups thousands, as format_number writes them ('1,500');
+# any other comma is a decimal one ('1,5')
+QUANTITY_PATTERN = re.compile(r'^\s*(?:(?P<grouped>\d{1,3}(?:,\d{3})+(?:\.\d+)?)(?![\d.,])|(?P<plain>\d+(?:[.,]\d+)?))'
+                              r'\s*(?P<unit>.*?)\s*$')
+
+def parse_quantity(text):
+    """'15 units' -> (15, 'units'), '1,500 pcs' -> (1500, 'pcs'); text without a number counts as one of itself"""
+    match = QUANTITY_PATTERN.match(str(text))
+    if not match:
+        return 1, str(text).strip() or 'units'
+    if match.group('grouped'):
+        count = float(match.group('grouped').replace(',', ''))
+    else:
+        count = float(match.group('plain').replace(',', '.'))
+    return (int(count) if count.is_integer() else count), match.group('unit') or 'units'
+
+def migrate_item(item):
+    """Split a legacy free-text quantity into count and unit, in place"""
+    if 'quantity' in item:
+        quantity = item.pop('quantity')
+        if 'count' not in item:
+            item['count'], item['unit'] = parse_quantity(quantity)
+    return item
+
+def migrate_inventory(data):
+    for storage in data['storages'].values():
+        for item in storage['items']:
+            migrate_item(item)
+    return data
+
+def normalize_count(value):
+    """Whole numbers are stored as ints - number inputs hand back floats"""
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+def format_number(value):
+    """1,500,000 or 2.5 - never scientific notation"""
+    if float(value).is_integer():
+        return f"{int(value):,}"
+    return f"{value:,.3f}".rstrip('0').rstrip('.')
+
+def format_quantity(item):
+    return f"{format_number(item.get('count', 0))} {item.get('unit', 'units')}"
+
+def is_low_stock(item):
+    return item.get('count', 0) < item.get('min_stock', 0)
+
+# INVENTORY STATISTICS - counters kept current by apply_change, never recomputed per render
+STATS_VERSION = 2  # bump when the counter layout changes - older counters are rebuilt on load
+
+def new_tally():
+    return {'items': 0, 'by_status': {}, 'units': {}}
+
+def count_item(stats, storage_id, item, delta):
+    """Add (delta=1) or remove (delta=-1) one item from every counter it belongs to"""
+    status = item.get('status')
+    category = item.get('category', 'Other')
+    unit = item.get('unit', 'units')
+    category_tally = stats['by_category'].setdefault(category, new_tally())
+    storage_tally = stats['by_storage'].setdefault(storage_id, new_tally())
+    for tally in (stats, category_tally, storage_tally):
+        tally['items'] += delta
+        tally['by_status'][status] = tally['by_status'].get(status, 0) + delta
+        if not tally['by_status'][status]:
+            del tally['by_status'][status]
+        tally['units'][unit] = tally['units'].get(unit, 0) + delta * item.get('count', 0)
+        if not tally['units'][unit]:
+            del tally['units'][unit]
+    if not category_tally['items']:
+        del stats['by_category'][category]
+    # Low-stock index - item id -> storage id of everything below its threshold
+    if delta > 0 and is_low_stock(item):
+        stats['low_stock'][item['id']] = storage_id
+    elif delta < 0:
+        stats['low_stock'].pop(item['id'], None)
+
+def build_stats(data):
+    """Full recount - only on load, when no up-to-date counters were saved"""
+    stats = dict(new_tally(), by_category={}, by_storage={}, low_stock={}, version=STATS_VERSION)
+    for storage_id, storage in data['storages'].items():
+        stats['by_storage'][storage_id] = new_tally()
+        for item in storage['items']:
+            count_item(stats, storage_id, item, 1)
+    data['stats'] = stats
+    return stats
+
+def get_stats(data):
+    stats = data.get('stats')
+    if stats is None or stats.get('version') != STATS_VERSION:
+        stats = build_stats(data)
+    return stats
+
+def summarize_inventory(data):
+    """Counters for the labs roll-up - small enough to read for every lab at once"""
+    stats = get_stats(data)
+    return {'storages': len(data['storages']), 'items': stats['items'], 'by_status': dict(stats['by_status']),
+            'by_category': {category: tally['items'] for category, tally in stats['by_category'].items()},
+            'low_stock': len(stats['low_stock']), 'journal_seq': data.get('journal_seq', 0)}
+
+# ITEM INDEX - item id -> (storage id, item), so edits, deletes and moves never scan item lists
+class ItemIndex:
+    """Where every item of an inventory is - kept in step by apply_change"""
+
+    def __init__(self):
+        self.items = {}  # item id -> (storage id, the item dict in its storage's list)
+
+    def build(self, data):
+        self.items = {item['id']: (storage_id, item)
+                      for storage_id, storage in data['storages'].items() for item in storage['items']}
+
+    def add(self, storage_id, item):
+        self.items[item['id']] = (storage_id, item)
+
+    def remove(self, item_id):
+        self.items.pop(item_id, None)
+
+    def locate(self, item_id):
+        """(storage id, item) - (None, None) for an unknown id"""
+        return self.items.get(item_id, (None, None))
+
+def find_item(storage, item_id, index=None):
+    """An item of one storage by id - an index lookup, or a scan of its list without an index"""
+    if index is not None:
+        storage_id, item = index.locate(item_id)
+        return item if storage_id == storage['id'] else None
+    return next((item for item in storage['items'] if item['id'] == item_id), None)
+
+def drop_item(storage, item):
+    """Take an item dict out of its storage's list"""
+    items = storage['items']
+    del items[next(i for i, other in enumerate(items) if other is item)]
+
+def touch_storage(storage, ts):
+    storage['last_updated'] = ts
+    storage['version'] = storage.get('version', 0) + 1
+
+def apply_change(data, entry, index=None):
+    """Apply one journal delta record to an inventory dict - and to its ItemIndex, if it has one"""
+    op = entry['op']
+    storages = data['storages']
+    stats = get_stats(data)
+    if op == 'add_storage':
+        storages[entry['storage']['id']] = entry['storage']
+        stats['by_storage'][entry['storage']['id']] = new_tally()
+        for item in entry['storage']['items']:
+            migrate_item(item)
+            count_item(stats, entry['storage']['id'], item, 1)
+            if index is not None:
+                index.add(entry['storage']['id'], item)
+    elif op == 'update_storage':
+        storage = storages[entry['storage_id']]
+        storage.update(entry['changes'])
+        touch_storage(storage, entry['ts'])
+    elif op == 'delete_storage':
+        storage = storages.pop(entry['storage_id'], None)
+        if storage is not None:
+            for item in storage['items']:
+                count_item(stats, entry['storage_id'], item, -1)
+                if index is not None:
+                    index.remove(item['id'])
+            stats['by_storage'].pop(entry['storage_id'], None)
+    elif op in ('add_item', 'update_item', 'remove_item'):
+        storage = storages.get(entry['storage_id'])
+        if storage is None:
+            return
+        if op == 'add_item':
+            storage['items'].append(migrate_item(entry['item']))
+            count_item(stats, entry['storage_id'], entry['item'], 1)
+            if index is not None:
+                index.add(entry['storage_id'], entry['item'])
+        else:
+            item = find_item(storage, entry['item_id'], index)
+            if item is not None:
+                count_item(stats, entry['storage_id'], item, -1)
+                if op == 'update_item':
+                    item.update(migrate_item(dict(entry['changes'])))
+                    count_item(stats, entry['storage_id'], item, 1)
+                else:
+                    drop_item(storage, item)
+                    if index is not None:
+                        index.remove(item['id'])
+        touch_storage(storage, entry['ts'])
+    elif op == 'move_item':
+        # The record carries the item, so a target storage read on its own can replay it too
+        source = storages.get(entry['storage_id'])
+        target = storages.get(entry['to_storage_id'])
+        item = None
+        if source is not None:
+            item = find_item(source, entry['item_id'], index)
+            if item is not None:
+                count_item(stats, entry['storage_id'], item, -1)
+                drop_item(source, item)
+            touch_storage(source, entry['ts'])
+        if target is not None and (item is not None or source is None):
+            item = item if item is not None else migrate_item(dict(entry['item']))
+            target['items'].append(item)
+            count_item(stats, entry['to_storage_id'], item, 1)
+            if index is not None:
+                index.add(entry['to_storage_id'], item)
+            touch_storage(target, entry['ts'])
+        elif item is not None and index is not None:
+            index.remove(item['id'])  # target deleted meanwhile - the item goes with it
+    elif op == 'import_items':
+        for storage in entry['storages']:
+            storages[storage['id']] = storage
+            stats['by_storage'][storage['id']] = new_tally()
+        for storage_id, item in entry['items']:
+            storage = storages.get(storage_id)
+            if storage is not None:
+                storage['items'].append(migrate_item(item))
+                count_item(stats, storage_id, item, 1)
+                if index is not None:
+                    index.add(storage_id, item)
+        for storage_id in get_entry_storages(entry):
+            if storage_id in storages:
+                touch_storage(storages[storage_id], entry['ts'])
+    data['journal_seq'] = max(data.get('journal_seq', 0), entry.get('seq', 0))
+
+def get_entry_storages(entry):
+    """IDs of the storages a journal delta record touches"""
+    if entry['op'] == 'import_items':
+        return {storage['id'] for storage in entry['storages']} | {storage_id for storage_id, _ in entry['items']}
+    if entry['op'] == 'move_item':
+        return {entry['storage_id'], entry['to_storage_id']}
+    return {entry.get('storage_id') or entry.get('storage', {}).get('id')}
+
+def get_file_stamp(path):
+    """(mtime, size) stamp of a data file, None when missing"""
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except FileNotFoundError:
+        return None
+
+class JsonBackend:
+    """JSON snapshot + append-only journal, compacted in the background"""
+
+    def __init__(self, data_file, lab=DEFAULT_LAB):
+        self.data_file = data_file
+        self.lab = lab
+        self.journal_file = f"{data_file}.journal"
+        self.index_file = f"{data_file}.index"
+        self.summary_file = f"{data_file}.summary"
+        self.lock_file = f"{data_file}.lock"
+        self.lock = threading.RLock()
+        self.lock_depth = 0
+        self.compacting = False
+        self.on_fold = None  # called with the records a compaction folds away, e.g. to back them up
+
+    @contextmanager
+    def write_lock(self):
+        """Exclusive lock around read-modify-write - across threads and processes"""
+        with self.lock:
+            if self.lock_depth:
+                # Re-entered by the thread already holding the file lock
+                self.lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self.lock_depth -= 1
+                return
+            with file_lock(self.lock_file):
+                self.lock_depth = 1
+                try:
+                    yield
+                finally:
+                    self.lock_depth = 0
+
+    def watched_files(self):
+        return [self.data_file, self.journal_file]
+
+    def read_journal(self, snapshot_seq=0, raw=None):
+        """Read journal entries newer than the snapshot - skips torn trailing lines"""
+        if raw is None:
+            if not os.path.exists(self.journal_file):
+                return []
+            with open(self.journal_file, 'rb') as f:
+                raw = f.read()
+        entries = []
+        for line in raw.decode('utf-8').splitlines():
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # A crash mid-append leaves a partial last line - ignore it
+                continue
+            if entry.get('seq', 0) > snapshot_seq:
+                entries.append(entry)
+        return entries
+
+    def last_seq(self):
+        """Sequence number of the newest journal record - reads only the file tail"""
+        if not os.path.exists(self.journal_file):
+            return 0
+        with open(self.journal_file, 'rb') as f:
+            size = f.seek(0, os.SEEK_END)
+            window = 4096
+            while True:
+                f.seek(max(0, size - window))
+                lines = f.read().split(b'\n')
+                complete = lines[1:-1] if window < size else lines[:-1]
+                for line in reversed(complete):
+                    try:
+                        return json.loads(line)['seq']
+                    except (ValueError, KeyError):
+                        continue
+                if window >= size:
+                    return 0
+                window *= 4
+
+    def decode_snapshot(self):
+        with open(self.data_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def read_snapshot(self):
+        if os.path.exists(self.data_file):
+            data = self.decode_snapshot()
+            # Validate and repair data structure
+            if 'storages' not in data:
+                data['storages'] = {}
+            migrate_inventory(data)
+            get_stats(data)
+            return data
+        data = get_default_inventory(self.lab)
+        build_stats(data)
+        return data
+
+    def load(self):
+        """Snapshot + journal replay, returning the data and a change cursor"""
+        while True:
+            cursor = {'snapshot': get_file_stamp(self.data_file), 'journal': get_file_stamp(self.journal_file)}
+            data = self.read_snapshot()
+            raw = b''
+            if os.path.exists(self.journal_file):
+                with open(self.journal_file, 'rb') as f:
+                    raw = f.read()
+            # A compaction swapped the files under us - the journal may miss folded records
+            if get_file_stamp(self.data_file) == cursor['snapshot']:
+                break
+        # Only consume complete lines; a partial append is picked up on the next refresh
+        cursor['offset'] = raw.rfind(b'\n') + 1
+        for entry in self.read_journal(data.get('journal_seq', 0), raw[:cursor['offset']]):
+            apply_change(data, entry)
+        return data, cursor
+
+    def read_snapshot_storage(self, storage_id, snapshot_stamp):
+        """(journal seq, storage or None) from the snapshot alone - its byte range, found through the
+        index. ValueError when the index does not match the snapshot"""
+        with open(self.index_file, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if snapshot_stamp is None or tuple(index['snapshot']) != snapshot_stamp:
+            raise ValueError("storage index is stale")
+        span = index['storages'].get(storage_id)
+        if span is None:
+            return index['journal_seq'], None
+        with open(self.data_file, 'rb') as f:
+            f.seek(span[0])
+            storage = json.loads(f.read(span[1]))
+        if storage.get('id') != storage_id:
+            raise ValueError("storage index is stale")
+        return index['journal_seq'], storage
+
+    def load_storage(self, storage_id):
+        """One storage - its part of the snapshot plus its journal records, without parsing the rest.
+        None when it does not exist or the snapshot can't be read by storage"""
+        try:
+            snapshot_stamp = get_file_stamp(self.data_file)
+            journal_seq, storage = self.read_snapshot_storage(storage_id, snapshot_stamp)
+            data = {'storages': {}, 'journal_seq': journal_seq}
+            if storage is not None:
+                for item in storage['items']:
+                    migrate_item(item)
+                data['storages'][storage_id] = storage
+            entries = self.read_journal(journal_seq)
+            # A compaction swapped the files under us - the journal may miss folded records
+            if get_file_stamp(self.data_file) != snapshot_stamp:
+                return None
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        for entry in entries:
+            if storage_id in get_entry_storages(entry):
+                apply_change(data, entry)
+        return data['storages'].get(storage_id)
+
+    def changes_since(self, cursor, data):
+        """Journal entries added since cursor - None when a full reload is needed"""
+        snapshot_stamp = get_file_stamp(self.data_file)
+        journal_stamp = get_file_stamp(self.journal_file)
+        if snapshot_stamp != cursor['snapshot']:
+            return None
+        if journal_stamp == cursor['journal']:
+            return [], cursor
+        if not journal_stamp or journal_stamp[1] < cursor['offset']:
+            return None
+        # Journal only grew - replay just the new tail
+        with open(self.journal_file, 'rb') as f:
+            f.seek(cursor['offset'])
+            raw = f.read()
+        consumed = raw.rfind(b'\n') + 1
+        entries = self.read_journal(data.get('journal_seq', 0), raw[:consumed])
+        return entries, {'snapshot': snapshot_stamp, 'journal': journal_stamp,
+                         'offset': cursor['offset'] + consumed}
+
+    def commit(self, entry, data):
+        """Append one delta record under the write lock - cost is the size of the change"""
+        entry['seq'] = max(self.last_seq(), data.get('journal_seq', 0)) + 1
+        record = (json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        with open(self.journal_file, 'ab') as f:
+            f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+        diagnostics.count('save.bytes', len(record))
+        with open(self.journal_file, 'rb') as f:
+            first_seq = json.loads(f.readline()).get('seq', entry['seq'])
+        if ((entry['seq'] - first_seq >= JOURNAL_COMPACT_THRESHOLD or not os.path.exists(self.data_file))
+                and not self.compacting):
+            self.compacting = True
+            threading.Thread(target=self.compact, daemon=True).start()
+
+    def serialize_snapshot(self, data):
+        """Indented JSON bytes, built storage by storage to record where each one lies"""
+        fields = {k: v for k, v in data.items() if k != 'storages'}
+        head = json.dumps(fields, indent=2, ensure_ascii=False)[:-2] + ',' if fields else '{'
+        chunks = [(head + '\n  "storages": {').encode('utf-8')]
+        position = len(chunks[0])
+        spans = {}
+        for storage_id, storage in data['storages'].items():
+            key = f'{"," if spans else ""}\n    {json.dumps(storage_id, ensure_ascii=False)}: '.encode('utf-8')
+            body = json.dumps(storage, indent=2, ensure_ascii=False).replace('\n', '\n    ').encode('utf-8')
+            spans[storage_id] = [position + len(key), len(body)]
+            chunks += [key, body]
+            position += len(key) + len(body)
+        chunks.append(b'\n  }\n}' if spans else b'}\n}')
+        return b''.join(chunks), spans
+
+    def write_snapshot(self, snapshot, spans, journal_seq=0, summary=None):
+        """Replace the snapshot file with serialized inventory bytes, then its storage index and
+        summary - older versions are kept by the backup worker, off the request path"""
+        write_atomic(self.data_file, snapshot)
+        diagnostics.count('snapshot.bytes', len(snapshot))
+        if spans is not None:
+            # The index names the exact snapshot it describes, so a stale one is never used
+            index = {'snapshot': get_file_stamp(self.data_file), 'journal_seq': journal_seq, 'storages': spans}
+            write_atomic(self.index_file, json.dumps(index).encode('utf-8'))
+        if summary is not None:
+            write_atomic(self.summary_file, json.dumps(summary, ensure_ascii=False).encode('utf-8'))
+
+    def save(self, inventory):
+        """Save full inventory snapshot to JSON file"""
+        snapshot, spans = self.serialize_snapshot(inventory)
+        with self.write_lock():
+            self.write_snapshot(snapshot, spans, inventory.get('journal_seq', 0), summarize_inventory(inventory))
+
+    def summary(self):
+        """Roll-up counters as of the latest snapshot, plus the journal records made since - the whole
+        inventory is read only while no summary was written yet"""
+        try:
+            with open(self.summary_file, 'r', encoding='utf-8') as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            return dict(summarize_inventory(self.load()[0]), pending=0)
+        summary['pending'] = max(0, self.last_seq() - summary['journal_seq'])
+        return summary
+
+    def replace(self, inventory, data):
+        """Swap in a whole inventory, e.g. a restored backup - the journal restarts after it and every
+        process reloads"""
+        with self.write_lock():
+            inventory['journal_seq'] = max(self.last_seq(), data.get('journal_seq', 0)) + 1
+            self.save(inventory)
+            checkpoint = {'op': 'checkpoint', 'seq': inventory['journal_seq']}
+            write_atomic(self.journal_file, (json.dumps(checkpoint) + '\n').encode('utf-8'))
+
+    def changes_after(self, seq):
+        """Journal records newer than seq - None when some were folded into the snapshot already"""
+        entries = self.read_journal()
+        if not entries:
+            return None
+        first = entries[0]
+        if (first['seq'] if first['op'] == 'checkpoint' else first['seq'] - 1) > seq:
+            return None
+        return [entry for entry in entries if entry['seq'] > seq and entry['op'] != 'checkpoint']
+
+    def compact(self):
+        """Fold the journal into a fresh snapshot - runs off the request path"""
+        started = time.perf_counter()
+        try:
+            # Only the journal bytes and the snapshot stamp are taken under the lock - parsing the
+            # snapshot would hold up every writer, so it happens outside and is checked against the stamp
+            with self.write_lock():
+                raw = b''
+                if os.path.exists(self.journal_file):
+                    with open(self.journal_file, 'rb') as f:
+                        raw = f.read()
+                snapshot_stamp = get_file_stamp(self.data_file)
+            data = self.read_snapshot()
+            if get_file_stamp(self.data_file) != snapshot_stamp:
+                return  # replaced while it was read - another process compacted or saved
+            if self.on_fold is not None:
+                self.on_fold(self.read_journal(0, raw))
+            # Rebuild from disk so changes journaled by other sessions are kept
+            entries = self.read_journal(data.get('journal_seq', 0), raw)
+            for entry in entries:
+                apply_change(data, entry)
+            snapshot, spans = self.serialize_snapshot(data)
+            with self.write_lock():
+                with open(self.journal_file, 'rb') as f:
+                    current = f.read()
+                if not current.startswith(raw) or get_file_stamp(self.data_file) != snapshot_stamp:
+                    return  # another process compacted or saved first
+                self.write_snapshot(snapshot, spans, data.get('journal_seq', 0), summarize_inventory(data))
+                # Drop the folded prefix, keeping anything appended meanwhile - a checkpoint
+                # record keeps the sequence number when nothing was
+                tail = current[len(raw):]
+                if not tail:
+                    checkpoint = {'op': 'checkpoint', 'seq': data.get('journal_seq', 0)}
+                    tail = (json.dumps(checkpoint) + '\n').encode('utf-8')
+                write_atomic(self.journal_file, tail)
+        except Exception:
+            logger.exception("Journal compaction error")
+        finally:
+            self.compacting = False
+            diagnostics.observe('inventory.compact', time.perf_counter() - started)
+
+class CompactBackend(JsonBackend):
+    """The JSON backend's journal with a compact msgpack snapshot - faster to load, smaller in memory,
+    and read by storage without a separate index"""
+
+    def __init__(self, data_file, seed_file=DATA_FILE, lab=DEFAULT_LAB):
+        super().__init__(data_file, lab)
+        if not os.path.exists(data_file) and os.path.exists(seed_file):
+            # First run - migrate the JSON inventory
+            self.save(JsonBackend(seed_file, lab).load()[0])
+
+    def decode_snapshot(self):
+        return compact_snapshot.read(self.data_file)
+
+    def serialize_snapshot(self, data):
+        return compact_snapshot.encode(data), None
+
+    def read_snapshot_storage(self, storage_id, snapshot_stamp):
+        if snapshot_stamp is None:
+            raise ValueError("no snapshot yet")
+        return compact_snapshot.read_storage(self.data_file, storage_id)
+
+class SqliteBackend:
+    """SQLite (WAL mode) storage with row-level transactional writes"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS storages (
+            id TEXT PRIMARY KEY,
+            position INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS items (
+            id TEXT PRIMARY KEY,
+            storage_id TEXT NOT NULL REFERENCES storages(id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            category TEXT,
+            status TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_items_storage ON items(storage_id, position);
+        CREATE INDEX IF NOT EXISTS idx_items_status ON items(status);
+        CREATE INDEX IF NOT EXISTS idx_items_category ON items(category);
+        CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, entry TEXT NOT NULL);
+    """
+    META_KEYS = ('categories', 'status_options', 'storage_types', 'app_url', 'created_at')
+
+    def __init__(self, db_file, seed_file=DATA_FILE, lab=DEFAULT_LAB):
+        self.db_file = db_file
+        self.lab = lab
+        self.local = threading.local()
+        conn = self.connect()
+        with conn:
+            conn.executescript(self.SCHEMA)
+        if conn.execute("SELECT COUNT(*) FROM meta").fetchone()[0] == 0:
+            # First run - migrate the JSON inventory (or the defaults) into the database
+            seed = JsonBackend(seed_file, lab)
+            self.save(seed.load()[0] if os.path.exists(seed_file) else get_default_inventory(lab))
+
+    def watched_files(self):
+        return [self.db_file, f"{self.db_file}-wal"]
+
+    def connect(self):
+        """One connection per thread - Streamlit serves sessions on separate threads"""
+        return connect_sqlite(self.db_file, self.local)
+
+    def load(self):
+        """Build the nested inventory dict from the tables"""
+        conn = self.connect()
+        owns_transaction = not conn.in_transaction
+        if owns_transaction:
+            conn.execute("BEGIN")
+        try:
+            data = {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM meta")}
+            data['storages'] = {}
+            for storage_id, storage_data in conn.execute("SELECT id, data FROM storages ORDER BY position"):
+                storage = json.loads(storage_data)
+                storage['items'] = []
+                data['storages'][storage_id] = storage
+            for storage_id, item_data in conn.execute("SELECT storage_id, data FROM items ORDER BY storage_id, position"):
+                if storage_id in data['storages']:
+                    data['storages'][storage_id]['items'].append(migrate_item(json.loads(item_data)))
+            build_stats(data)
+            cursor = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+        finally:
+            if owns_transaction:
+                conn.execute("COMMIT")
+        data['journal_seq'] = cursor
+        return data, cursor
+
+    def load_storage(self, storage_id):
+        """One storage and its items by primary key and index - None when it does not exist"""
+        conn = self.connect()
+        owns_transaction = not conn.in_transaction
+        if owns_transaction:
+            conn.execute("BEGIN")
+        try:
+            row = conn.execute("SELECT data FROM storages WHERE id = ?", (storage_id,)).fetchone()
+            if row is None:
+                return None
+            storage = json.loads(row[0])
+            storage['items'] = [migrate_item(json.loads(item_data)) for (item_data,) in conn.execute(
+                "SELECT data FROM items WHERE storage_id = ? ORDER BY position", (storage_id,))]
+        finally:
+            if owns_transaction:
+                conn.execute("COMMIT")
+        return storage
+
+    def changes_since(self, cursor, data):
+        """Change-feed rows newer than cursor - None when they were pruned"""
+        rows = self.connect().execute(
+            "SELECT seq, entry FROM changes WHERE seq > ? ORDER BY seq", (cursor,)).fetchall()
+        if not rows:
+            return [], cursor
+        if rows[0][0] != cursor + 1 and cursor:
+            return None
+        entries = []
+        for seq, entry in rows:
+            entry = json.loads(entry)
+            if entry['op'] == 'reload':
+                return None
+            entry['seq'] = seq
+            entries.append(entry)
+        return entries, rows[-1][0]
+
+    def storage_row(self, storage, position):
+        fields = {k: v for k, v in storage.items() if k != 'items'}
+        return (storage['id'], position, storage['name'], json.dumps(fields, ensure_ascii=False))
+
+    def item_rows(self, storage_id, items, start=0):
+        return [(item['id'], storage_id, start + i, item['name'], item.get('category'),
+                 item.get('status'), json.dumps(item, ensure_ascii=False))
+                for i, item in enumerate(items)]
+
+    def write_change(self, conn, entry):
+        """Translate one delta record into row-level statements"""
+        op = entry['op']
+        if op == 'add_storage':
+            position = conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM storages").fetchone()[0]
+            conn.execute("INSERT INTO storages VALUES (?, ?, ?, ?)", self.storage_row(entry['storage'], position))
+            conn.executemany("INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             self.item_rows(entry['storage']['id'], entry['storage']['items']))
+        elif op == 'update_storage':
+            row = conn.execute("SELECT data FROM storages WHERE id = ?", (entry['storage_id'],)).fetchone()
+            if row:
+                storage = json.loads(row[0])
+                storage.update(entry['changes'], last_updated=entry['ts'])
+                storage['version'] = storage.get('version', 0) + 1
+                conn.execute("UPDATE storages SET name = ?, data = ? WHERE id = ?",
+                             (storage['name'], json.dumps(storage, ensure_ascii=False), entry['storage_id']))
+        elif op == 'delete_storage':
+            conn.execute("DELETE FROM storages WHERE id = ?", (entry['storage_id'],))
+        elif op in ('add_item', 'update_item', 'remove_item'):
+            if op == 'add_item':
+                position = conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM items WHERE storage_id = ?",
+                                        (entry['storage_id'],)).fetchone()[0]
+                conn.execute("INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             self.item_rows(entry['storage_id'], [entry['item']], position)[0])
+            elif op == 'update_item':
+                row = conn.execute("SELECT data FROM items WHERE id = ?", (entry['item_id'],)).fetchone()
+                if row:
+                    item = migrate_item(json.loads(row[0]))
+                    item.update(migrate_item(dict(entry['changes'])))
+                    conn.execute("UPDATE items SET name = ?, category = ?, status = ?, data = ? WHERE id = ?",
+                                 (item['name'], item.get('category'), item.get('status'),
+                                  json.dumps(item, ensure_ascii=False), entry['item_id']))
+            else:
+                conn.execute("DELETE FROM items WHERE id = ?", (entry['item_id'],))
+            self.touch_storages(conn, [entry['storage_id']], entry['ts'])
+        elif op == 'move_item':
+            # One row changes storage - neither storage's other items are touched
+            if conn.execute("SELECT 1 FROM storages WHERE id = ?", (entry['to_storage_id'],)).fetchone():
+                position = conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM items WHERE storage_id = ?",
+                                        (entry['to_storage_id'],)).fetchone()[0]
+                moved = conn.execute("UPDATE items SET storage_id = ?, position = ? WHERE id = ? AND storage_id = ?",
+                                     (entry['to_storage_id'], position, entry['item_id'], entry['storage_id'])).rowcount
+                self.touch_storages(conn, [entry['storage_id']] + ([entry['to_storage_id']] if moved else []),
+                                    entry['ts'])
+            else:
+                conn.execute("DELETE FROM items WHERE id = ? AND storage_id = ?", (entry['item_id'], entry['storage_id']))
+                self.touch_storages(conn, [entry['storage_id']], entry['ts'])
+        elif op == 'import_items':
+            position = conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM storages").fetchone()[0]
+            conn.executemany("INSERT INTO storages VALUES (?, ?, ?, ?)",
+                             [self.storage_row(storage, position + i) for i, storage in enumerate(entry['storages'])])
+            by_storage = {}
+            for storage_id, item in entry['items']:
+                by_storage.setdefault(storage_id, []).append(item)
+            for storage_id, items in by_storage.items():
+                start = conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM items WHERE storage_id = ?",
+                                     (storage_id,)).fetchone()[0]
+                conn.executemany("INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                 self.item_rows(storage_id, items, start))
+            self.touch_storages(conn, get_entry_storages(entry), entry['ts'])
+
+    def touch_storages(self, conn, storage_ids, ts):
+        """Stamp last_updated and bump the version of storages whose items changed"""
+        for storage_id in storage_ids:
+            row = conn.execute("SELECT data FROM storages WHERE id = ?", (storage_id,)).fetchone()
+            if row:
+                storage = json.loads(row[0])
+                storage['last_updated'] = ts
+                storage['version'] = storage.get('version', 0) + 1
+                conn.execute("UPDATE storages SET data = ? WHERE id = ?",
+                             (json.dumps(storage, ensure_ascii=False), storage_id))
+
+    @contextmanager
+    def write_lock(self):
+        """IMMEDIATE transaction - takes the database write lock up front"""
+        conn = self.connect()
+        if conn.in_transaction:
+            yield
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def commit(self, entry, data):
+        """Apply the change as one transaction and publish it on the change feed"""
+        with self.write_lock():
+            conn = self.connect()
+            self.write_change(conn, entry)
+            record = json.dumps(entry, ensure_ascii=False)
+            entry['seq'] = conn.execute("INSERT INTO changes (entry) VALUES (?)", (record,)).lastrowid
+            diagnostics.count('save.bytes', len(record.encode('utf-8')))
+            if entry['seq'] % CHANGE_LOG_KEEP == 0:
+                conn.execute("DELETE FROM changes WHERE seq <= ?", (entry['seq'] - CHANGE_LOG_KEEP,))
+
+    def replace(self, inventory, data):
+        """Swap in a whole inventory, e.g. a restored backup - every process reloads"""
+        with self.write_lock():
+            self.save(inventory)
+            inventory['journal_seq'] = self.connect().execute("SELECT MAX(seq) FROM changes").fetchone()[0]
+
+    def changes_after(self, seq):
+        """Change-feed rows newer than seq - None when some were pruned or the data was replaced"""
+        changes = self.changes_since(seq, None)
+        if changes is None or (changes[0] and changes[0][0]['seq'] != seq + 1):
+            return None
+        return changes[0]
+
+    def summary(self):
+        """Roll-up counters from the indexed status and category columns - no item is parsed"""
+        conn = self.connect()
+        by_status = dict(conn.execute("SELECT status, COUNT(*) FROM items GROUP BY status"))
+        by_category = dict(conn.execute("SELECT category, COUNT(*) FROM items GROUP BY category"))
+        return {'storages': conn.execute("SELECT COUNT(*) FROM storages").fetchone()[0],
+                'items': sum(by_status.values()), 'by_status': by_status, 'by_category': by_category,
+                'low_stock': None, 'pending': 0}
+
+    def save(self, inventory):
+        """Replace the whole database contents in one transaction"""
+        with self.write_lock():
+            conn = self.connect()
+            conn.execute("DELETE FROM items")
+            conn.execute("DELETE FROM storages")
+            conn.execute("DELETE FROM meta")
+            conn.executemany("INSERT INTO meta VALUES (?, ?)",
+                             [(key, json.dumps(inventory[key], ensure_ascii=False))
+                              for key in self.META_KEYS if key in inventory])
+            for position, storage in enumerate(inventory['storages'].values()):
+                conn.execute("INSERT INTO storages VALUES (?, ?, ?, ?)", self.storage_row(storage, position))
+                conn.executemany("INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                 self.item_rows(storage['id'], storage['items']))
+            # Tell other processes to reload instead of replaying deltas
+            conn.execute("INSERT INTO changes (entry) VALUES (?)", (json.dumps({'op': 'reload'}),))
+
+@st.cache_resource
+def get_backend(lab=DEFAULT_LAB, kind=STORAGE_BACKEND):
+    """Process-wide persistence backend of one lab, selected by INVENTORY_BACKEND"""
+    if kind == 'sqlite':
+        return SqliteBackend(lab_file(lab, DB_FILE), lab_file(lab, DATA_FILE), lab)
+    if kind == 'compact':
+        if compact_snapshot.available():
+            return CompactBackend(lab_file(lab, COMPACT_FILE), lab_file(lab, DATA_FILE), lab)
+        logger.warning("INVENTORY_BACKEND=compact needs msgpack (pip install msgpack) - using the JSON snapshot")
+    return JsonBackend(lab_file(lab, DATA_FILE), lab)
+
+# SHARED INVENTORY STORE - one parsed copy per process, shared by all sessions
+@st.cache_resource
+def get_inventory_store(lab=DEFAULT_LAB):
+    """Process-wide inventory cache of one lab, with a monotonically increasing version"""
+    return {
+        'lab': lab,
+        'lock': threading.RLock(),
+        'data': None,
+        'version': 0,
+        'cursor': None,
+        'items': ItemIndex(),
+        'search': InventoryIndex(),
+        'subscribers': {}  # session id -> storage id it shows, None for everything
+    }
+
+def refresh_inventory(store, backend=None):
+    """Bring the shared inventory up to date - a cheap check when unchanged"""
+    backend = backend or get_backend(store['lab'])
+    try:
+        if store['data'] is not None:
+            changes = backend.changes_since(store['cursor'], store['data'])
+            if changes is not None:
+                entries, store['cursor'] = changes
+                for entry in entries:
+                    apply_change(store['data'], entry, store['items'])
+                    store['search'].apply(store['data'], entry, store['items'])
+                if entries:
+                    diagnostics.count('inventory.changes_applied', len(entries))
+                    store['version'] += 1
+                    notify_sessions(store, set().union(*map(get_entry_storages, entries)))
+                return bool(entries)
+        with diagnostics.span('inventory.load'):
+            store['data'], store['cursor'] = backend.load()
+        diagnostics.count('inventory.reloads')
+    except Exception as e:
+        # st.error goes nowhere on the change watcher's thread - the log keeps the traceback
+        logger.exception("Data loading error")
+        st.error(f"Data loading error: {e}")
+        if store['data'] is None:
+            store['data'] = get_default_inventory(store['lab'])
+            store['items'].build(store['data'])
+            store['search'].build(store['data'])
+        return False
+    store['items'].build(store['data'])
+    with diagnostics.span('search.build'):
+        store['search'].build(store['data'])
+    store['version'] += 1
+    notify_sessions(store, None)
+    return True
+
+def get_inventory():
+    """Shared inventory - re-read only when the stored data changed"""
+    store = get_inventory_store(lab)
+    with store['lock']:
+        refresh_inventory(store)
+        return store['data']
+
+# LIVE UPDATES - sessions subscribe to what they show and are rerun when it changes
+WATCH_INTERVAL = 0.25  # seconds between checks for other processes' writes without file events
+WATCH_EVENT_FALLBACK = 5  # safety re-check interval when file-system events are available
+
+def subscribe_session(storage_id=None):
+    """Rerun this session on changes to one storage - or to anything, when storage_id is None"""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is not None:
+        get_inventory_store(lab)['subscribers'][ctx.session_id] = storage_id
+
+def unsubscribe_session():
+    """Forms being filled in are left alone - a rerun could disturb the user"""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is not None:
+        get_inventory_store(lab)['subscribers'].pop(ctx.session_id, None)
+
+# Pushing reruns to other sessions uses Streamlit internals of the pinned streamlit==1.28.0 -
+# Runtime._session_mgr, AppSession._event_loop and AppSession._client_state. Should a release drop
+# them, sessions fall back to picking up changes on their next rerun, and that is logged once
+@st.cache_resource
+def get_live_push_state():
+    return {'disabled': None}
+
+def disable_live_push(reason):
+    state = get_live_push_state()
+    if state['disabled'] is None:
+        state['disabled'] = reason
+        logger.warning("Live updates off (%s) - other sessions show changes on their next rerun", reason)
+
+def notify_sessions(store, storage_ids):
+    """Rerun subscribed sessions showing changed data (storage_ids None = everything changed)"""
+    if not store['subscribers'] or not Runtime.exists() or get_live_push_state()['disabled']:
+        return
+    session_manager = getattr(Runtime.instance(), '_session_mgr', None)
+    if not hasattr(session_manager, 'get_active_session_info'):
+        disable_live_push("no Runtime._session_mgr")
+        return
+    current = get_script_run_ctx(suppress_warning=True)
+    for session_id, storage_id in list(store['subscribers'].items()):
+        if current is not None and session_id == current.session_id:
+            continue  # the writing session reruns itself
+        if storage_ids is not None and storage_id is not None and storage_id not in storage_ids:
+            continue
+        session_info = session_manager.get_active_session_info(session_id)
+        if session_info is None:
+            store['subscribers'].pop(session_id, None)  # browser tab closed
+            continue
+        # Same call Streamlit makes for run-on-save - rerun with the client's last query string - made
+        # on the server's event loop, which owns the session
+        session = session_info.session
+        event_loop = getattr(session, '_event_loop', None)
+        if event_loop is None or not hasattr(session, '_client_state'):
+            disable_live_push("no AppSession._event_loop or _client_state")
+            return
+        try:
+            event_loop.call_soon_threadsafe(session.request_rerun, session._client_state)
+        except RuntimeError:  # event loop closed - the server is shutting down
+            store['subscribers'].pop(session_id, None)
+
+class ChangeWatcher:
+    """Pulls writes made by other processes into the shared store - one thread per process"""
+
+    def __init__(self, store, backend):
+        self.store = store
+        self.backend = backend
+        self.wake = threading.Event()
+        self.stamps = self.get_stamps()
+        self.observer = None
+        if Observer is not None:
+            try:
+                self.observer = self.watch_files(backend.watched_files())
+            except Exception as e:
+                logger.warning("File watching unavailable, polling instead: %s", e)
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def watch_files(self, paths):
+        paths = {os.path.abspath(path) for path in paths}
+        wake = self.wake
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if os.path.abspath(event.src_path) in paths or \
+                        os.path.abspath(getattr(event, 'dest_path', '') or '') in paths:
+                    wake.set()
+
+        observer = Observer()
+        for directory in {os.path.dirname(path) for path in paths}:
+            observer.schedule(Handler(), directory)
+        observer.daemon = True
+        observer.start()
+        return observer
+
+    def get_stamps(self):
+        return [get_file_stamp(path) for path in self.backend.watched_files()]
+
+    def poll(self):
+        with self.store['lock']:
+            if self.store['data'] is not None:
+                refresh_inventory(self.store, self.backend)
+                return
+        # Only storage scans served so far - they read their storage on their own, so compare file
+        # stamps instead of parsing the whole inventory under the store lock and blocking them
+        stamps = self.get_stamps()
+        if stamps != self.stamps:
+            self.stamps = stamps
+            notify_sessions(self.store, None)
+
+    def run(self):
+        while True:
+            self.wake.wait(WATCH_INTERVAL if self.observer is None else WATCH_EVENT_FALLBACK)
+            self.wake.clear()
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Change watcher error")
+
+@st.cache_resource
+def get_change_watcher(lab=DEFAULT_LAB):
+    return ChangeWatcher(get_inventory_store(lab), get_backend(lab))
+
+# BACKUPS - compressed full snapshots plus the journaled changes in between, written off the request path
+BACKUP_DIR = "inventory_backups"
+BACKUP_INTERVAL = 300  # seconds between backup runs
+BACKUP_FULL_INTERVAL = 24 * 3600  # a fresh full snapshot at least this often...
+BACKUP_FULL_CHANGES = 5000  # ...or after this many changes, which bounds the replay of a restore
+BACKUP_KEEP_DAYS = float(os.environ.get('INVENTORY_BACKUP_KEEP_DAYS', 30))  # any moment this far back can be restored
+BACKUP_MAX_MB = float(os.environ.get('INVENTORY_BACKUP_MAX_MB', 500))  # older backups go first beyond this
+
+class BackupWorker:
+    """Archives new changes every BACKUP_INTERVAL - one thread per process, one process at a time"""
+
+    def __init__(self, backups, store, backend):
+        self.backups = backups
+        self.store = store
+        self.backend = backend
+        self.wake = threading.Event()
+        # Not isinstance - the cached backend may come from an earlier run, whose classes were
+        # defined by a different execution of this script
+        if hasattr(backend, 'on_fold'):
+            backend.on_fold = self.keep_folded
+        threading.Thread(target=self.run, daemon=True, name='inventory-backups').start()
+
+    def run(self):
+        while True:
+            self.wake.wait(BACKUP_INTERVAL)
+            self.wake.clear()
+            try:
+                self.back_up()
+            except Exception:
+                logger.exception("Backup error")
+
+    def keep_folded(self, entries):
+        """Back up the records a journal compaction is about to drop, when the backups lead up to them"""
+        try:
+            with self.backups.lock():
+                archived = self.backups.archived_seq()
+                entries = [entry for entry in entries if entry['seq'] > archived and entry['op'] != 'checkpoint']
+                if archived >= 0 and entries and entries[0]['seq'] == archived + 1:
+                    diagnostics.count('backup.bytes', self.backups.write_changes(entries))
+        except Exception:
+            logger.exception("Backup error")
+
+    def back_up(self):
+        """Back up what changed since the last run - a full snapshot when one is due or changes are
+        missing. False when another process is backing up"""
+        with self.backups.lock(blocking=False) as locked:
+            if not locked:
+                return False
+            with diagnostics.span('backup.run'):
+                fulls, _ = self.backups.catalog()
+                archived = self.backups.archived_seq()
+                latest = (self.store['data'] or {}).get('journal_seq', 0)
+                if fulls and latest <= archived:
+                    written = 0
+                else:
+                    entries = None
+                    if (fulls and time.time() - fulls[-1]['ts'] < BACKUP_FULL_INTERVAL
+                            and latest - fulls[-1]['last'] < BACKUP_FULL_CHANGES):
+                        entries = self.backend.changes_after(archived)
+                    if entries is None:
+                        # Read from disk, not the shared store - no session waits on its lock meanwhile
+                        written = self.backups.write_full(self.backend.load()[0])
+                    else:
+                        written = self.backups.write_changes(entries) if entries else 0
+                self.backups.prune(BACKUP_KEEP_DAYS * 86400, BACKUP_MAX_MB * 2**20)
+            diagnostics.count('backup.bytes', written)
+            return True
+
+@st.cache_resource
+def get_backup_worker(lab=DEFAULT_LAB):
+    return BackupWorker(Backups(lab_file(lab, BACKUP_DIR)), get_inventory_store(lab), get_backend(lab))
+
+def get_restore_events(data, restored, index, user=None):
+    """Ledger events taking every item from its current state to its restored one"""
+    events, seen = [], set()
+    for storage_id, storage in restored['storages'].items():
+        for item in storage['items']:
+            seen.add(item['id'])
+            current_storage_id, current = index.locate(item['id'])
+            if current is None:
+                events.append(history_event(item, storage_id, 'status', None, item['status'], item['status'], user))
+                continue
+            if current_storage_id != storage_id:
+                events.append(history_event(item, storage_id, 'move', current_storage_id, storage_id,
+                                            item['status'], user))
+            if current['status'] != item['status']:
+                events.append(history_event(item, storage_id, 'status', current['status'], item['status'],
+                                            item['status'], user))
+    for storage_id, storage in data['storages'].items():
+        events += [history_event(item, storage_id, 'status', item['status'], None, None, user)
+                   for item in storage['items'] if item['id'] not in seen]
+    return events
+
+def restore_inventory(restored, user=None):
+    """Make a restored backup the live inventory on every device - its item changes go to the ledger"""
+    worker = get_backup_worker(lab)
+    worker.back_up()  # the state being replaced stays restorable
+    store = get_inventory_store(lab)
+    backend = get_backend(lab)
+    with store['lock']:
+        with backend.write_lock():
+            refresh_inventory(store)
+            events = get_restore_events(store['data'], restored, store['items'], user)
+            backend.replace(restored, store['data'])
+        refresh_inventory(store)
+        seq = store['data'].get('journal_seq')
+    record_history(events, seq=seq)
+    # Changes committed from here on follow this snapshot
+    with worker.backups.lock():
+        worker.backups.write_full(restored)
+
+# ITEM SEARCH - answered from the shared index, which follows every change
+SEARCH_RESULTS_LIMIT = 50  # result rows shown; the total is still reported
+
+def search_items(text, categories=(), statuses=()):
+    """Matching (storage, item) pairs, and the total count before the display limit"""
+    store = get_inventory_store(lab)
+    with store['lock']:
+        matches, total = store['search'].search(text, categories, statuses, SEARCH_RESULTS_LIMIT)
+        results = []
+        for storage_id, item_id in matches:
+            storage = store['data']['storages'][storage_id]
+            results.append((storage, find_item(storage, item_id, store['items'])))
+    return results, total
+
+# DASHBOARD PAGING - bounds the widgets built per rerun, whatever the inventory size
+DASHBOARD_PAGE_SIZES = [10, 25, 50]  # storages per page
+REORDER_ITEMS_SHOWN = 20  # most urgent low-stock items listed on the dashboard; the rest are counted
+ITEMS_PAGE_SIZE = 20  # item rows shown per storage before "Show more"
+
+# STORAGE VIEW - what every storage QR scan opens, rendered before anything else is set up
+STORAGE_VIEW_CACHE_ENTRIES = 256  # rendered item lists kept, one per storage state
+
+def get_status_icon(status):
+    icons = {
+        'Available': '🟢',
+        'In Use': '🔴', 
+        'Maintenance': '🟡',
+        'Broken': '❌',
+        'Reserved': '⏳'
+    }
+    return icons.get(status, '⚪')
+
+def get_storage_for_view(storage_id):
+    """One storage - from the shared store once loaded, else read on its own from the backend"""
+    store = get_inventory_store(lab)
+    with store['lock']:
+        if store['data'] is not None:
+            refresh_inventory(store)
+            return store['data']['storages'].get(storage_id)
+    try:
+        with diagnostics.span('inventory.load_storage'):
+            return get_backend(lab).load_storage(storage_id)
+    except Exception:
+        logger.exception("Storage view read error")
+        return None
+
+@st.cache_data(max_entries=STORAGE_VIEW_CACHE_ENTRIES)
+def render_storage_items(lab, storage_id, version, last_updated, _items):
+    """Item list markdown for one state of a storage - reused by every scan until it changes"""
+    lines = []
+    for item in _items:
+        icon = get_status_icon(item['status'])
+        low = " | ⚠️ Low stock" if is_low_stock(item) else ""
+        lines.append(f"{icon} **{item['name']}**  \n"
+                     f"{format_quantity(item)} | {item.get('category', 'Other')} | {item['status']}{low}")
+    return "\n\n".join(lines)
+
+def show_storage_only_view(storage):
+    """View for storage QR codes - READ ONLY"""
+    st.title(f"🚁 {storage['name']}")
+    st.markdown(f"**Location:** {storage['location']} | **Type:** {storage['type'].title()}")
+    
+    # Refresh button - the rerun reads the storage again
+    if st.button("🔄 Refresh Data", key="refresh_storage"):
+        st.rerun()
+    
+    st.warning("📱 **Storage View Only** - Scan Central QR for full management access")
+    
+    if st.button("🏠 Go to Full Dashboard"):
+        st.experimental_set_query_params(**lab_query())
+        st.rerun()
+    
+    st.markdown("---")
+    
+    # Show items in this storage - FIXED SYNTAX
+    st.subheader(f"Items ({len(storage['items'])})")
+    
+    if storage['items']:
+        st.markdown(render_storage_items(lab, storage['id'], storage.get('version', 0), storage['last_updated'],
+                                         storage['items']))
+    else:
+        st.info("No items in this storage")
+    
+    st.caption(f"Last updated: {storage['last_updated']}")
+
+# Which lab this page belongs to - ?lab=<id>, the default lab without one
+lab = st.experimental_get_query_params().get("lab", [DEFAULT_LAB])[0]
+if not lab_exists(lab):
+    st.error(f"❌ Unknown lab '{lab}' - check the link or QR code")
+    st.stop()
+
+# Storage QR scans stop here - no full inventory load, session setup or QR imports; the watcher
+# only compares file stamps until a full page loads the inventory
+scan_params = st.experimental_get_query_params()
+if scan_params.get("view", [None])[0] == 'storage':
+    scanned_storage = get_storage_for_view(scan_params.get("id", [None])[0])
+    if scanned_storage is not None:
+        get_change_watcher(lab)
+        subscribe_session(scanned_storage['id'])
+        show_storage_only_view(scanned_storage)
+        finish_rerun('storage_scan')
+        st.stop()
 
 # LOAD SHARED DATA - Same for all devices
-inventory = load_inventory()
+inventory = get_inventory()
 
 # Initialize session state for UI only
 if 'ui_state' not in st.session_state:
@@ -84,90 +1361,484 @@ if 'ui_state' not in st.session_state:
         'current_view': 'dashboard',
         'selected_storage': None,
         'selected_item': None,
-        'qr_codes': {},
         'last_refresh': datetime.now(),
+        'edit_base': None,
+        'dashboard_page': 0,
+        'page_size': DASHBOARD_PAGE_SIZES[0],
+        'item_limits': {},
         'delete_pending': None
     }
 
+# QR CODE CACHE - content-addressed, shared by all sessions and kept on disk
+QR_CACHE_DIR = ".qr_cache"
+QR_CACHE_MEMORY_ITEMS = 512   # PNGs kept in process memory
+QR_CACHE_DISK_ITEMS = 5000    # PNGs kept on disk before the least recently used are evicted
+QR_RENDER_PARAMS = {'version': 5, 'error_correction': 'H', 'box_size': 12, 'border': 4}
+
+QR_POOL_WORKERS = os.cpu_count() or 1
+
 def generate_qr_code(data):
     """Generate HIGH QUALITY QR code"""
+    import qr_labels  # qrcode and Pillow load on first use - storage scans never need them
     try:
-        qr = qrcode.QRCode(
-            version=5,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,
-            box_size=12,
-            border=4,
-        )
-        qr.add_data(data)
-        qr.make(fit=True)
-        
-        qr_img = qr.make_image(fill_color="black", back_color="white")
-        buf = io.BytesIO()
-        qr_img.save(buf, format="PNG")
-        buf.seek(0)
-        return buf.getvalue()
+        with diagnostics.span('qr.render'):
+            return qr_labels.render_qr_png(data, QR_RENDER_PARAMS)
     except Exception as e:
         st.error(f"QR generation error: {e}")
         return None
 
+@st.cache_resource
+def get_qr_cache():
+    """Process-wide LRU of rendered QR PNGs"""
+    return {'lock': threading.Lock(), 'images': OrderedDict(), 'disk_count': None}
+
+def get_qr_cache_key(data):
+    """Hash of the encoded text and render parameters - a new app_url gives new keys"""
+    payload = json.dumps([data, QR_RENDER_PARAMS], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def prune_qr_disk_cache(cache):
+    """Evict the least recently used PNGs once the disk cache is over its limit"""
+    files = [entry for entry in os.scandir(QR_CACHE_DIR) if entry.name.endswith('.png')]
+    excess = len(files) - QR_CACHE_DISK_ITEMS
+    if excess > 0:
+        for entry in sorted(files, key=lambda e: e.stat().st_mtime)[:excess]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+    cache['disk_count'] = min(len(files), QR_CACHE_DISK_ITEMS)
+
+def lookup_qr_image(key):
+    """Cached PNG for a key - memory LRU first, then disk; None on a miss"""
+    cache = get_qr_cache()
+    with cache['lock']:
+        image = cache['images'].get(key)
+        if image is not None:
+            cache['images'].move_to_end(key)
+            diagnostics.count('qr.cache.memory_hits')
+            return image
+    path = os.path.join(QR_CACHE_DIR, f"{key}.png")
+    try:
+        with open(path, 'rb') as f:
+            image = f.read()
+        os.utime(path)  # mtime doubles as the disk LRU clock
+    except OSError:
+        diagnostics.count('qr.cache.misses')
+        return None
+    diagnostics.count('qr.cache.disk_hits')
+    remember_qr_image(key, image)
+    return image
+
+def remember_qr_image(key, image):
+    """Keep a PNG in the memory LRU"""
+    cache = get_qr_cache()
+    with cache['lock']:
+        cache['images'][key] = image
+        cache['images'].move_to_end(key)
+        while len(cache['images']) > QR_CACHE_MEMORY_ITEMS:
+            cache['images'].popitem(last=False)
+
+def store_qr_image(key, image):
+    """Add a freshly rendered PNG to both cache layers"""
+    cache = get_qr_cache()
+    path = os.path.join(QR_CACHE_DIR, f"{key}.png")
+    try:
+        os.makedirs(QR_CACHE_DIR, exist_ok=True)
+        write_atomic(path, image)
+        with cache['lock']:
+            if cache['disk_count'] is None or cache['disk_count'] >= QR_CACHE_DISK_ITEMS:
+                prune_qr_disk_cache(cache)
+            cache['disk_count'] += 1
+    except OSError:
+        pass  # a read-only disk only costs us the persistent layer
+    remember_qr_image(key, image)
+
+def get_qr_image(data):
+    """QR PNG for data - memory LRU, then disk, then render"""
+    key = get_qr_cache_key(data)
+    image = lookup_qr_image(key)
+    if image is None:
+        image = generate_qr_code(data)
+        if image is not None:
+            store_qr_image(key, image)
+    return image
+
+@st.cache_resource
+def get_qr_pool():
+    """Process pool shared by every batch - workers are started once per server"""
+    import qr_labels
+    return qr_labels.create_qr_pool(QR_POOL_WORKERS)
+
+def generate_qr_batch(payloads):
+    """QR PNGs for many texts - cache hits are reused, misses rendered on all cores"""
+    import qr_labels
+    keys = [get_qr_cache_key(data) for data in payloads]
+    images = [lookup_qr_image(key) for key in keys]
+    missing = [i for i, image in enumerate(images) if image is None]
+    with diagnostics.span('qr.render_batch'):
+        rendered = qr_labels.render_qr_batch(get_qr_pool(), QR_POOL_WORKERS,
+                                             [payloads[i] for i in missing], QR_RENDER_PARAMS)
+    for i, image in zip(missing, rendered):
+        store_qr_image(keys[i], image)
+        images[i] = image
+    return images
+
+def get_storage_qr_batch(storage_ids):
+    """Storage QR PNGs for a set of storage IDs, keyed by storage ID"""
+    images = generate_qr_batch([get_storage_qr_url(storage_id) for storage_id in storage_ids])
+    return dict(zip(storage_ids, images))
+
+# LABEL SHEET EXPORT - built off the request path so the dashboard stays responsive
+LABEL_JOBS_KEEP = 20
+@st.cache_resource
+def get_label_jobs():
+    """Process-wide label-sheet jobs by ID"""
+    return {}
+
+def build_label_sheet_job(job, storages, fmt):
+    import qr_labels
+    try:
+        images = get_storage_qr_batch([storage['id'] for storage in storages])
+        labels = [(images[storage['id']], storage['name'], storage['location']) for storage in storages]
+        job['data'] = qr_labels.build_label_sheet(labels, fmt)
+        job['status'] = 'done'
+    except Exception as e:
+        job['error'] = str(e)
+        job['status'] = 'error'
+
+def start_label_sheet_job(storage_ids, fmt='pdf'):
+    """Start building a label sheet in the background and return its job ID"""
+    store = get_inventory_store(lab)
+    with store['lock']:
+        shared = store['data']['storages']
+        storages = [{key: value for key, value in shared[storage_id].items() if key != 'items'}
+                    for storage_id in storage_ids if storage_id in shared]
+    job_id = generate_id()
+    job = {'status': 'running', 'format': fmt, 'count': len(storages), 'data': None, 'error': None}
+    jobs = get_label_jobs()
+    jobs[job_id] = job
+    while len(jobs) > LABEL_JOBS_KEEP:
+        jobs.pop(next(iter(jobs)))
+    threading.Thread(target=build_label_sheet_job, args=(job, storages, fmt), daemon=True).start()
+    return job_id
+
+# BULK IMPORT / EXPORT - whole files in one journaled change, rows streamed in and out
+IMPORT_ERRORS_SHOWN = 50  # invalid rows listed in the preview; all are counted
+
+def build_import_batch(rows, data):
+    """Validate import rows against the inventory - (storages to create, [storage id, item] pairs, errors).
+    data['storages'] is iterated, so pass a copy (copy_storages) rather than the shared one"""
+    categories = {category.lower(): category for category in data['categories']}
+    statuses = {status.lower(): status for status in data['status_options']}
+    default_category = categories.get('other', data['categories'][0])
+    storage_ids = {storage_id.lower(): storage_id for storage_id in data['storages']}
+    storage_names = {}
+    for storage_id, storage in data['storages'].items():
+        storage_names.setdefault(storage['name'].strip().lower(), storage_id)
+    new_storages = {}
+    items = []
+    errors = []
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for number, row in rows:
+        name = row.get('name', '')
+        storage_key = row.get('storage_id', '').lower()
+        storage_name = row.get('storage', '')
+        if not name:
+            errors.append((number, "missing item name"))
+            continue
+        category = categories.get((row.get('category') or default_category).lower())
+        if category is None:
+            errors.append((number, f"unknown category '{row['category']}'"))
+            continue
+        status = statuses.get((row.get('status') or data['status_options'][0]).lower())
+        if status is None:
+            errors.append((number, f"unknown status '{row['status']}'"))
+            continue
+        if not row.get('count'):
+            errors.append((number, "missing quantity"))
+            continue
+        if not QUANTITY_PATTERN.match(row['count']):
+            errors.append((number, f"invalid quantity '{row['count']}'"))
+            continue
+        count, unit = parse_quantity(row['count'])
+        try:
+            min_stock = normalize_count(row.get('min_stock') or 0)
+        except ValueError:
+            min_stock = -1
+        if min_stock < 0:
+            errors.append((number, f"invalid reorder level '{row['min_stock']}'"))
+            continue
+        # Resolve the target storage - by ID, then by name, else create it once for the batch
+        storage_id = storage_ids.get(storage_key) or storage_names.get(storage_name.lower())
+        if storage_id is None:
+            if not storage_name:
+                errors.append((number, "missing storage"))
+                continue
+            storage_id = f"storage_{generate_id()}"
+            storage_type = row.get('type', '').lower()
+            new_storages[storage_id] = {
+                'id': storage_id,
+                'name': storage_name,
+                'location': row.get('location') or 'Drone Lab AIC',
+                'type': storage_type if storage_type in data['storage_types'] else 'other',
+                'description': '',
+                'items': [],
+                'last_updated': now
+            }
+            storage_names[storage_name.lower()] = storage_id
+        items.append([storage_id, {
+            'id': f"item_{generate_id()}",
+            'name': name,
+            'count': count,
+            'unit': row.get('unit') or unit,
+            'min_stock': min_stock,
+            'category': category,
+            'status': status
+        }])
+    return list(new_storages.values()), items, errors
+
+def iter_export_rows(data):
+    """One row per item, in storage order"""
+    for storage_id, storage in data['storages'].items():
+        for item in storage['items']:
+            yield [storage_id, storage['name'], storage.get('location', ''), storage.get('type', ''),
+                   item['id'], item['name'], item.get('count', 0), item.get('unit', 'units'),
+                   item.get('min_stock', 0), item.get('category', 'Other'), item.get('status', '')]
+
+def export_inventory(fmt='csv'):
+    """The whole inventory as CSV, XLSX or JSON bytes - copied under the store lock so no change lands
+    mid-file, then written out without holding up other sessions"""
+    import bulk_io  # openpyxl is only loaded when someone imports or exports
+    store = get_inventory_store(lab)
+    with store['lock']:
+        if fmt == 'json':
+            data = copy.deepcopy(store['data'])
+        else:
+            rows = list(iter_export_rows(store['data']))
+    if fmt == 'json':
+        return JsonBackend(DATA_FILE).serialize_snapshot(data)[0]
+    return bulk_io.write_xlsx(rows) if fmt == 'xlsx' else bulk_io.write_csv(rows)
+
+# ITEM HISTORY - status changes and moves go to the ledger once they are committed
+HISTORY_EVENTS_SHOWN = 500
+
+@st.cache_resource
+def get_ledger(lab=DEFAULT_LAB):
+    """Process-wide handle on one lab's history ledger - seeded with the items already there on first use"""
+    ledger = Ledger(lab_file(lab, LEDGER_FILE))
+    seed_history(ledger, get_inventory_store(lab))
+    return ledger
+
+def history_event(item, storage_id, kind, old, new, status, user=None):
+    return {'item_id': item['id'], 'name': item.get('name'), 'category': item.get('category', 'Other'),
+            'kind': kind, 'old': old, 'new': new, 'status': status, 'storage_id': storage_id, 'user': user}
+
+def get_history_events(data, entry, index=None):
+    """Ledger events for one change, read against the inventory as it was before it"""
+    op = entry['op']
+    user = entry.get('user')
+    storages = data['storages']
+    if op == 'add_item':
+        item = entry['item']
+        return [history_event(item, entry['storage_id'], 'status', None, item['status'], item['status'], user)]
+    if op == 'add_storage':
+        return [history_event(item, entry['storage']['id'], 'status', None, item['status'], item['status'], user)
+                for item in entry['storage']['items']]
+    if op == 'import_items':
+        return [history_event(item, storage_id, 'status', None, item['status'], item['status'], user)
+                for storage_id, item in entry['items']]
+    if op == 'delete_storage':
+        storage = storages.get(entry['storage_id'], {'items': []})
+        return [history_event(item, entry['storage_id'], 'status', item['status'], None, None, user)
+                for item in storage['items']]
+    if op == 'move_item':
+        item = entry['item']
+        return [history_event(item, entry['to_storage_id'], 'move', entry['storage_id'], entry['to_storage_id'],
+                              item['status'], user)]
+    if op in ('update_item', 'remove_item'):
+        storage = storages.get(entry['storage_id'])
+        item = find_item(storage, entry['item_id'], index) if storage is not None else None
+        if item is None:
+            return []
+        if op == 'remove_item':
+            return [history_event(item, entry['storage_id'], 'status', item['status'], None, None, user)]
+        status = entry['changes'].get('status', item['status'])
+        if status != item['status']:
+            return [history_event(dict(item, **entry['changes']), entry['storage_id'], 'status',
+                                  item['status'], status, status, user)]
+    return []
+
+def seed_history(ledger, store):
+    """Items that predate the ledger start out in their current status - read under the store lock,
+    written after it"""
+    if ledger.seeded:
+        return
+    with store['lock']:
+        if store['data'] is None:
+            refresh_inventory(store)
+        data = store['data']
+        events = [history_event(item, storage_id, 'status', None, item['status'], item['status'])
+                  for storage_id, storage in data['storages'].items() for item in storage['items']]
+        seq = data.get('journal_seq', 0)
+    ledger.seed(events, seq)
+
+def describe_history_event(kind, old, new, storage_names):
+    if kind == 'move':
+        return f"Moved {storage_names.get(old, old)} → {storage_names.get(new, new)}"
+    if old is None:
+        return f"Added as {new}"
+    if new is None:
+        return f"Removed (was {old})"
+    return f"{old} → {new}"
+
+def get_history_change(data, entry, index=None):
+    """(ledger events, (item id, name, category) to describe anew or None) for one change - read
+    against the inventory before it applies"""
+    events = get_history_events(data, entry, index)
+    if events or entry['op'] != 'update_item' or not {'name', 'category'} & set(entry['changes']):
+        return events, None
+    storage = data['storages'].get(entry['storage_id'])
+    item = find_item(storage, entry['item_id'], index) if storage is not None else None
+    if item is None:
+        return events, None
+    item = dict(item, **entry['changes'])
+    return events, (item['id'], item['name'], item.get('category', 'Other'))
+
+def record_history(events, described=None, ts=None, seq=None):
+    """Write a committed change to the ledger once the inventory locks are released - the ledger
+    orders changes by their journal seq. Never fails the save itself"""
+    try:
+        ledger = get_ledger(lab)
+        if events:
+            ledger.record(events, ts, seq)
+        elif described is not None:
+            ledger.describe(*described)
+    except Exception:
+        logger.exception("History ledger error")
+
 def get_app_url():
     """Get the current app URL"""
     return inventory.get('app_url', 'https://drone-lab-inventory-l8phzdn3dqn38cppfacdtr.streamlit.app')
 
+def get_storage_qr_url(storage_id):
+    """URL encoded in a storage QR code - it names the lab, storage IDs are only unique within one"""
+    return f"{get_app_url()}?{urlencode({**lab_query(), 'view': 'storage', 'id': storage_id})}"
+
 def get_storage_qr_code(storage_id):
     """Get QR code for specific storage"""
-    qr_key = f"storage_{storage_id}"
-    if qr_key not in st.session_state.ui_state['qr_codes']:
-        qr_data = f"{get_app_url()}?view=storage&id={storage_id}"
-        qr_image = generate_qr_code(qr_data)
-        if qr_image:
-            st.session_state.ui_state['qr_codes'][qr_key] = qr_image
-    return st.session_state.ui_state['qr_codes'].get(qr_key)
+    return get_qr_image(get_storage_qr_url(storage_id))
 
 def get_central_qr_code():
     """Get central QR code for full access"""
-    if 'central_qr' not in st.session_state.ui_state['qr_codes']:
-        qr_data = f"{get_app_url()}"
-        qr_image = generate_qr_code(qr_data)
-        if qr_image:
-            st.session_state.ui_state['qr_codes']['central_qr'] = qr_image
-    return st.session_state.ui_state['qr_codes'].get('central_qr')
-
-def get_status_icon(status):
-    icons = {
-        'Available': '🟢',
-        'In Use': '🔴', 
-        'Maintenance': '🟡',
-        'Broken': '❌',
-        'Reserved': '⏳'
-    }
-    return icons.get(status, '⚪')
+    return get_qr_image(f"{get_app_url()}?{urlencode(lab_query())}" if lab != DEFAULT_LAB else get_app_url())
 
 def generate_id():
     return str(uuid.uuid4())[:8]
 
 def force_refresh():
-    """Force refresh data from file"""
+    """Sync with the shared store - a cheap version check, not a full reload"""
     global inventory
-    inventory = load_inventory()
+    inventory = get_inventory()
     st.session_state.ui_state['last_refresh'] = datetime.now()
 
-def auto_save():
-    """Auto-save after any change"""
-    if save_inventory(inventory):
-        st.session_state.ui_state['last_refresh'] = datetime.now()
-        return True
-    return False
+def get_edit_base(storage, item=None):
+    """What an edit form started from - used to detect stale saves"""
+    fields = item if item is not None else {k: v for k, v in storage.items() if k != 'items'}
+    return {'storage_id': storage['id'], 'version': storage.get('version', 0), 'fields': dict(fields)}
+
+def rebase_edit(data, entry, base, index=None):
+    """Merge an edit made against an older storage version - None if it conflicts"""
+    storage = data['storages'].get(entry['storage_id'])
+    if storage is None:
+        return None
+    # Versions count per storage - after a move the numbers say nothing, so always merge then
+    if base.get('storage_id') == entry['storage_id'] and storage.get('version', 0) == base['version']:
+        return entry
+    if entry['op'] == 'update_item':
+        current = find_item(storage, entry['item_id'], index)
+        if current is None:
+            return None
+    else:
+        current = storage
+    changes = {}
+    for field, value in entry['changes'].items():
+        original = base['fields'].get(field)
+        if value == original:
+            continue  # not touched here - keep whatever the other device saved
+        if current.get(field) not in (original, value):
+            return None  # both devices changed the same field
+        changes[field] = value
+    return dict(entry, changes=changes)
+
+def prepare_move(store, entry):
+    """A move record carrying the item as it is now - None once the item left its storage or the
+    target storage is gone"""
+    storage_id, item = store['items'].locate(entry['item_id'])
+    if (item is None or storage_id != entry['storage_id'] or entry['to_storage_id'] == storage_id
+            or entry['to_storage_id'] not in store['data']['storages']):
+        return None
+    return dict(entry, item=dict(item))
+
+def commit_change(op, base=None, **changes):
+    """Journal one change under the write lock - False if it conflicts with a newer save"""
+    entry = {'op': op, 'ts': datetime.now().strftime("%Y-%m-%d %H:%M:%S"), **changes}
+    store = get_inventory_store(lab)
+    backend = get_backend(lab)
+    with store['lock']:
+        with backend.write_lock():
+            # Catch up first so the new record is sequenced after everything on disk
+            refresh_inventory(store)
+            if base is not None:
+                entry = rebase_edit(store['data'], entry, base, store['items'])
+                if entry is None:
+                    return False
+            if op == 'move_item':
+                entry = prepare_move(store, entry)
+                if entry is None:
+                    return False
+            with diagnostics.span('inventory.commit'):
+                backend.commit(entry, store['data'])
+            history = get_history_change(store['data'], entry, store['items'])
+        # Replay our own record from the backend, in order with any concurrent writers
+        refresh_inventory(store)
+    # Other writers don't wait on the ledger's I/O
+    with diagnostics.span('history.record'):
+        record_history(*history, entry_time(entry), entry['seq'])
+    return True
+
+def auto_save(op, base=None, **changes):
+    """Auto-save after any change - journals just the delta"""
+    global inventory
+    try:
+        committed = commit_change(op, base, user=st.session_state.ui_state.get('user'), **changes)
+    except Exception as e:
+        st.error(f"Data saving error: {e}")
+        return False
+    store = get_inventory_store(lab)
+    inventory = store['data']
+    if not committed:
+        st.warning("⚠️ This was changed on another device meanwhile - reload and try again.")
+        return False
+    st.session_state.ui_state['last_refresh'] = datetime.now()
+    return True
+
+def locate_item(item_id):
+    """(storage, item) in the shared inventory by item id - (None, None) once it is gone"""
+    store = get_inventory_store(lab)
+    with store['lock']:
+        storage_id, item = store['items'].locate(item_id)
+        if item is None:
+            return None, None
+        return store['data']['storages'][storage_id], item
 
-def safe_delete_item(storage_id, item_index):
-    """Safe item deletion without confirmation popup"""
+def safe_delete_item(item_id):
+    """Safe item deletion without confirmation popup - by id, so a concurrent change can't shift it"""
     try:
-        storage = inventory['storages'][storage_id]
-        if 0 <= item_index < len(storage['items']):
-            item_name = storage['items'][item_index]['name']
-            storage['items'].pop(item_index)
-            storage['last_updated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            if auto_save():
+        storage, item = locate_item(item_id)
+        if item is not None:
+            item_name = item['name']
+            if auto_save('remove_item', storage_id=storage['id'], item_id=item_id):
                 st.success(f"✅ '{item_name}' deleted successfully!")
                 return True
     except Exception as e:
@@ -180,17 +1851,32 @@ def main():
     view_type = query_params.get("view", [None])[0]
     storage_id = query_params.get("id", [None])[0]
     
-    # Auto-refresh every 20 seconds
-    if (datetime.now() - st.session_state.ui_state['last_refresh']).seconds > 20:
-        force_refresh()
-        st.rerun()
+    # Live updates - the watcher reruns this session as soon as the data it shows changes
+    get_change_watcher(lab)
+    get_backup_worker(lab)
+    get_ledger(lab)  # seeded here, before this process records any change
+    st.session_state.ui_state['last_refresh'] = datetime.now()
     
     # Handle storage-specific view
     if view_type == 'storage' and storage_id in inventory['storages']:
-        show_storage_only_view(storage_id)
+        subscribe_session(storage_id)
+        show_storage_only_view(inventory['storages'][storage_id])
+    elif view_type == 'diagnostics':
+        unsubscribe_session()
+        diagnostics_view()
+    elif view_type == 'backups':
+        unsubscribe_session()
+        backups_view()
+    elif view_type == 'labs':
+        unsubscribe_session()
+        labs_view()
     else:
         # Handle main navigation
         current_view = st.session_state.ui_state['current_view']
+        if current_view in ('add_storage', 'edit_storage', 'add_item', 'edit_item', 'import_export'):
+            unsubscribe_session()
+        else:
+            subscribe_session()
         
         if current_view == 'add_storage':
             add_storage_view()
@@ -200,53 +1886,24 @@ def main():
             add_item_view()
         elif current_view == 'edit_item':
             edit_item_view()
+        elif current_view == 'import_export':
+            import_export_view()
+        elif current_view == 'history':
+            history_view()
         else:
             dashboard_view()
 
-def show_storage_only_view(storage_id):
-    """View for storage QR codes - READ ONLY"""
-    storage = inventory['storages'][storage_id]
-    
-    st.title(f"🚁 {storage['name']}")
-    st.markdown(f"**Location:** {storage['location']} | **Type:** {storage['type'].title()}")
-    
-    # Refresh button
-    if st.button("🔄 Refresh Data", key="refresh_storage"):
-        force_refresh()
-        st.rerun()
-    
-    st.warning("📱 **Storage View Only** - Scan Central QR for full management access")
-    
-    if st.button("🏠 Go to Full Dashboard"):
-        st.experimental_set_query_params()
-        st.rerun()
-    
-    st.markdown("---")
-    
-    # Show items in this storage - FIXED SYNTAX
-    st.subheader(f"Items ({len(storage['items'])})")
-    
-    if storage['items']:
-        for item in storage['items']:
-            icon = get_status_icon(item['status'])
-            st.write(f"{icon} **{item['name']}**")
-            st.caption(f"{item['quantity']} | {item.get('category', 'Other')} | {item['status']}")
-    else:
-        st.info("No items in this storage")
-    
-    st.caption(f"Last updated: {storage['last_updated']}")
-
 def dashboard_view():
     """Full dashboard with management capabilities"""
-    st.title("🚁 Drone Lab AIC - Inventory System")
+    st.title(f"🚁 {get_lab_name(lab)} - Inventory System")
     st.markdown("### 🔄 REAL-TIME SYNC - Changes appear on all devices instantly")
     
     # Auto-refresh indicator
     last_refresh = st.session_state.ui_state['last_refresh'].strftime("%H:%M:%S")
-    st.caption(f"🔄 Auto-sync active | Last sync: {last_refresh}")
+    st.caption(f"🔄 Live sync active | Last sync: {last_refresh}")
     
     # Quick actions
-    col1, col2, col3 = st.columns(3)
+    col1, col2, col3, col4 = st.columns(4)
     with col1:
         if st.button("➕ Add Storage", use_container_width=True):
             st.session_state.ui_state['current_view'] = 'add_storage'
@@ -255,21 +1912,28 @@ def dashboard_view():
         if st.button("🔄 Force Refresh", use_container_width=True):
             force_refresh()
             st.rerun()
+    with col3:
+        if st.button("📥 Import / Export", use_container_width=True):
+            st.session_state.ui_state['current_view'] = 'import_export'
+            st.rerun()
+    with col4:
+        if st.button("📜 History", use_container_width=True):
+            st.session_state.ui_state['current_view'] = 'history'
+            st.rerun()
     
     st.markdown("---")
     
-    # Statistics
+    # Statistics - read from the maintained counters, no item scan
+    stats = copy_dashboard_stats()
     total_storages = len(inventory['storages'])
-    total_items = sum(len(storage['items']) for storage in inventory['storages'].values())
-    available_items = sum(1 for storage in inventory['storages'].values() for item in storage['items'] if item['status'] == 'Available')
     
     col1, col2, col3, col4 = st.columns(4)
     with col1:
         st.metric("Storage Units", total_storages)
     with col2:
-        st.metric("Total Items", total_items)
+        st.metric("Total Items", stats['items'])
     with col3:
-        st.metric("Available", available_items)
+        st.metric("Available", stats['by_status'].get('Available', 0))
     with col4:
         central_qr = get_central_qr_code()
         if central_qr:
@@ -284,6 +1948,17 @@ def dashboard_view():
                 key="dl_central"
             )
     
+    col_status, col_category, col_reorder = st.columns(3)
+    with col_status:
+        with st.expander("📊 Items by Status"):
+            status_breakdown_panel(stats)
+    with col_category:
+        with st.expander("🗂️ Items by Category"):
+            category_breakdown_panel(stats)
+    with col_reorder:
+        with st.expander(f"⚠️ Needs Reorder ({format_number(stats['low_stock_count'])})"):
+            reorder_panel(stats)
+    
     st.markdown("---")
     
     # QR Code Instructions
@@ -294,6 +1969,15 @@ def dashboard_view():
     - **Real-time Sync**: Changes appear instantly on all devices
     """)
     
+    with st.expander("🏷️ Print QR Labels"):
+        label_sheet_panel()
+    
+    st.markdown("---")
+    
+    # Item search
+    st.subheader("🔍 Search Items")
+    search_panel()
+    
     st.markdown("---")
     
     # Storage Management
@@ -303,70 +1987,235 @@ def dashboard_view():
         st.info("🚁 No storage units yet. Click 'Add Storage' to create your first one!")
         return
     
-    for storage_id, storage in inventory['storages'].items():
-        with st.expander(f"🚀 {storage['name']} ({len(storage['items'])} items)", expanded=True):
-            col_left, col_right = st.columns([3, 1])
+    # Only the current page is rendered - widget count and QR payload stay bounded
+    storage_ids = list(inventory['storages'])
+    page_size = st.session_state.ui_state['page_size']
+    page_count = max(1, -(-len(storage_ids) // page_size))
+    page = min(st.session_state.ui_state['dashboard_page'], page_count - 1)
+    pagination_controls(page, page_count, len(storage_ids))
+    
+    with diagnostics.span('dashboard.storage_cards'):
+        for storage_id in storage_ids[page * page_size:(page + 1) * page_size]:
+            storage = inventory['storages'].get(storage_id)
+            if storage is not None:  # deleted by another session mid-render
+                storage_card(storage_id, storage)
+
+def copy_storages():
+    """{storage id: its fields without the items} for every storage, copied under the store lock -
+    safe to iterate while other sessions and the change watcher add and remove storages"""
+    store = get_inventory_store(lab)
+    with store['lock']:
+        return {storage_id: {key: value for key, value in storage.items() if key != 'items'}
+                for storage_id, storage in store['data']['storages'].items()}
+
+def copy_dashboard_stats():
+    """The counters the dashboard panels show, copied under the store lock - other sessions' commits
+    and the change watcher update the shared ones in place. Only the REORDER_ITEMS_SHOWN most urgent
+    low-stock items are copied, as (storage name, item copy) pairs"""
+    store = get_inventory_store(lab)
+    with store['lock']:
+        stats = get_stats(store['data'])
+        located = (store['items'].locate(item_id) for item_id in stats['low_stock'])
+        urgent = heapq.nsmallest(REORDER_ITEMS_SHOWN, ((storage_id, item) for storage_id, item in located if item),
+                                 key=lambda pair: pair[1]['count'] - pair[1]['min_stock'])
+        low_stock = [(store['data']['storages'][storage_id]['name'], dict(item)) for storage_id, item in urgent]
+        return {
+            'items': stats['items'],
+            'by_status': dict(stats['by_status']),
+            'by_category': {category: {'items': tally['items'], 'by_status': dict(tally['by_status']),
+                                       'units': dict(tally['units'])}
+                            for category, tally in stats['by_category'].items()},
+            'low_stock': low_stock,
+            'low_stock_count': len(stats['low_stock'])
+        }
+
+def status_breakdown_panel(stats):
+    """Item counts per status across all storages"""
+    if not stats['items']:
+        st.info("No items yet")
+        return
+    statuses = inventory['status_options'] + [s for s in stats['by_status'] if s not in inventory['status_options']]
+    for status in statuses:
+        count = stats['by_status'].get(status, 0)
+        st.write(f"{get_status_icon(status)} **{status}**: {count} ({count * 100 // stats['items']}%)")
+
+def category_breakdown_panel(stats):
+    """Per-category totals split by status, with lab-wide quantities per unit"""
+    if not stats['by_category']:
+        st.info("No items yet")
+        return
+    rows = []
+    for category, tally in sorted(stats['by_category'].items(), key=lambda entry: -entry[1]['items']):
+        quantity = ", ".join(f"{format_number(count)} {unit}" for unit, count in sorted(tally['units'].items()))
+        row = {'Category': category, 'Items': tally['items'], 'Quantity': quantity}
+        for status in inventory['status_options']:
+            row[status] = tally['by_status'].get(status, 0)
+        rows.append(row)
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+
+def reorder_panel(stats):
+    """Items below their reorder threshold, most urgent first - read from the low-stock index"""
+    if not stats['low_stock']:
+        st.success("✅ Everything is above its reorder threshold")
+        return
+    for storage_name, item in stats['low_stock']:
+        st.write(f"⚠️ **{item['name']}** → 📦 {storage_name}")
+        st.caption(f"{format_quantity(item)} left • reorder below {format_number(item['min_stock'])}")
+    hidden = stats['low_stock_count'] - len(stats['low_stock'])
+    if hidden > 0:
+        st.caption(f"+{format_number(hidden)} more below their reorder threshold")
+
+def search_panel():
+    """Search box with category/status filters - prefix and typo-tolerant matching"""
+    col_text, col_category, col_status = st.columns([2, 1, 1])
+    with col_text:
+        text = st.text_input("Search", placeholder="e.g., 5 inch props, LiPo, cabinet", key="search_text")
+    with col_category:
+        categories = st.multiselect("Category", inventory['categories'], key="search_categories")
+    with col_status:
+        statuses = st.multiselect("Status", inventory['status_options'], key="search_statuses")
+    
+    if not (text.strip() or categories or statuses):
+        return
+    results, total = search_items(text, categories, statuses)
+    if not total:
+        st.info("No matching items")
+        return
+    if total > len(results):
+        st.caption(f"{total} matching items - showing the first {len(results)}")
+    else:
+        st.caption(f"{total} matching items")
+    for storage, item in results:
+        icon = get_status_icon(item['status'])
+        st.write(f"{icon} **{item['name']}** → 📦 {storage['name']}")
+        st.caption(f"{format_quantity(item)} • {item.get('category', 'Other')} • {item['status']} • {storage['location']}")
+
+def pagination_controls(page, page_count, total_storages):
+    """Prev/next and page-size controls for the storage list"""
+    col_prev, col_info, col_next, col_size = st.columns([1, 2, 1, 1])
+    with col_prev:
+        if st.button("◀ Prev", disabled=page == 0, use_container_width=True, key="page_prev"):
+            st.session_state.ui_state['dashboard_page'] = page - 1
+            st.rerun()
+    with col_info:
+        st.caption(f"Page {page + 1} of {page_count} • {total_storages} storage units")
+    with col_next:
+        if st.button("Next ▶", disabled=page >= page_count - 1, use_container_width=True, key="page_next"):
+            st.session_state.ui_state['dashboard_page'] = page + 1
+            st.rerun()
+    with col_size:
+        page_size = st.selectbox("Per page", DASHBOARD_PAGE_SIZES, label_visibility="collapsed",
+                                 index=DASHBOARD_PAGE_SIZES.index(st.session_state.ui_state['page_size']))
+        if page_size != st.session_state.ui_state['page_size']:
+            st.session_state.ui_state['page_size'] = page_size
+            st.session_state.ui_state['dashboard_page'] = 0
+            st.rerun()
+
+def storage_card(storage_id, storage):
+    """One storage in the dashboard list - collapsed, with a capped item list"""
+    with st.expander(f"🚀 {storage['name']} ({len(storage['items'])} items)", expanded=False):
+        col_left, col_right = st.columns([3, 1])
+        
+        with col_left:
+            st.write(f"**Location:** {storage['location']}")
+            st.write(f"**Type:** {storage['type'].title()}")
+            if storage.get('description'):
+                st.write(f"**Description:** {storage['description']}")
+            st.write(f"**Last Updated:** {storage['last_updated']}")
             
-            with col_left:
-                st.write(f"**Location:** {storage['location']}")
-                st.write(f"**Type:** {storage['type'].title()}")
-                if storage.get('description'):
-                    st.write(f"**Description:** {storage['description']}")
-                st.write(f"**Last Updated:** {storage['last_updated']}")
-                
-                st.markdown("---")
-                st.write("**Items:**")
-                
-                if storage['items']:
-                    for i, item in enumerate(storage['items']):
-                        col_item, col_edit, col_delete = st.columns([3, 1, 1])
-                        with col_item:
-                            icon = get_status_icon(item['status'])
-                            st.write(f"{icon} **{item['name']}**")
-                            st.caption(f"{item['quantity']} • {item.get('category', 'Other')}")
-                        with col_edit:
-                            if st.button("✏️", key=f"edit_{storage_id}_{item['id']}"):
-                                st.session_state.ui_state['current_view'] = 'edit_item'
-                                st.session_state.ui_state['selected_storage'] = storage_id
-                                st.session_state.ui_state['selected_item'] = i
+            st.markdown("---")
+            st.write("**Items:**")
+            
+            if storage['items']:
+                item_limit = st.session_state.ui_state['item_limits'].get(storage_id, ITEMS_PAGE_SIZE)
+                for item in storage['items'][:item_limit]:
+                    col_item, col_edit, col_delete = st.columns([3, 1, 1])
+                    with col_item:
+                        icon = get_status_icon(item['status'])
+                        st.write(f"{icon} **{item['name']}**")
+                        low = " • ⚠️ Low stock" if is_low_stock(item) else ""
+                        st.caption(f"{format_quantity(item)} • {item.get('category', 'Other')}{low}")
+                    with col_edit:
+                        if st.button("✏️", key=f"edit_{storage_id}_{item['id']}"):
+                            st.session_state.ui_state['current_view'] = 'edit_item'
+                            st.session_state.ui_state['selected_storage'] = storage_id
+                            st.session_state.ui_state['selected_item'] = item['id']
+                            st.session_state.ui_state['edit_base'] = get_edit_base(storage, item)
+                            st.rerun()
+                    with col_delete:
+                        # SIMPLE DELETE - No confirmation popup
+                        if st.button("🗑️", key=f"delete_{storage_id}_{item['id']}"):
+                            if safe_delete_item(item['id']):
                                 st.rerun()
-                        with col_delete:
-                            # SIMPLE DELETE - No confirmation popup
-                            if st.button("🗑️", key=f"delete_{storage_id}_{item['id']}"):
-                                if safe_delete_item(storage_id, i):
-                                    st.rerun()
-                else:
-                    st.info("No items in this storage")
-                
-                if st.button("➕ Add Item", key=f"add_{storage_id}", use_container_width=True):
-                    st.session_state.ui_state['current_view'] = 'add_item'
-                    st.session_state.ui_state['selected_storage'] = storage_id
-                    st.rerun()
+                remaining = len(storage['items']) - item_limit
+                if remaining > 0:
+                    if st.button(f"⬇️ Show more ({remaining} more items)", key=f"more_{storage_id}"):
+                        st.session_state.ui_state['item_limits'][storage_id] = item_limit + ITEMS_PAGE_SIZE
+                        st.rerun()
+            else:
+                st.info("No items in this storage")
             
-            with col_right:
-                storage_qr = get_storage_qr_code(storage_id)
-                if storage_qr:
-                    st.image(storage_qr, width=130)
-                    st.caption(f"**Storage QR - View Only**")
-                    st.download_button(
-                        label="📥 Download",
-                        data=storage_qr,
-                        file_name=f"qr_{storage['name'].replace(' ', '_')}.png",
-                        mime="image/png",
-                        key=f"dl_{storage_id}",
-                        use_container_width=True
-                    )
-                
-                st.markdown("---")
-                
-                if st.button("⚙️ Manage Storage", key=f"manage_{storage_id}", use_container_width=True):
-                    st.session_state.ui_state['current_view'] = 'edit_storage'
-                    st.session_state.ui_state['selected_storage'] = storage_id
-                    st.rerun()
-                
-                available = sum(1 for item in storage['items'] if item['status'] == 'Available')
-                st.metric("Available", available)
-                st.metric("Total", len(storage['items']))
+            if st.button("➕ Add Item", key=f"add_{storage_id}", use_container_width=True):
+                st.session_state.ui_state['current_view'] = 'add_item'
+                st.session_state.ui_state['selected_storage'] = storage_id
+                st.rerun()
+        
+        with col_right:
+            storage_qr = get_storage_qr_code(storage_id)
+            if storage_qr:
+                st.image(storage_qr, width=130)
+                st.caption(f"**Storage QR - View Only**")
+                st.download_button(
+                    label="📥 Download",
+                    data=storage_qr,
+                    file_name=f"qr_{storage['name'].replace(' ', '_')}.png",
+                    mime="image/png",
+                    key=f"dl_{storage_id}",
+                    use_container_width=True
+                )
+            
+            st.markdown("---")
+            
+            if st.button("⚙️ Manage Storage", key=f"manage_{storage_id}", use_container_width=True):
+                st.session_state.ui_state['current_view'] = 'edit_storage'
+                st.session_state.ui_state['selected_storage'] = storage_id
+                st.session_state.ui_state['edit_base'] = get_edit_base(storage)
+                st.rerun()
+            
+            tally = get_stats(inventory)['by_storage'].get(storage_id, new_tally())
+            st.metric("Available", tally['by_status'].get('Available', 0))
+            st.metric("Total", tally['items'])
+
+def label_sheet_panel():
+    """Batch QR export - the sheet is built in the background while you keep working"""
+    all_storages = st.checkbox("All storages", value=True, key="label_all")
+    if all_storages:
+        selected = list(inventory['storages'])
+    else:
+        selected = st.multiselect("Storages", list(inventory['storages']), key="label_storages",
+                                  format_func=lambda sid: inventory['storages'].get(sid, {}).get('name', sid))
+    fmt = st.radio("Format", ['PDF', 'PNG'], horizontal=True, key="label_format",
+                   help="PDF: one multi-page file. PNG: a ZIP with one image per page.").lower()
+    if st.button("🏷️ Build Label Sheet", disabled=not selected, use_container_width=True):
+        st.session_state.ui_state['label_job'] = start_label_sheet_job(selected, fmt)
+    
+    job = get_label_jobs().get(st.session_state.ui_state.get('label_job'))
+    if job is None:
+        return
+    if job['status'] == 'running':
+        st.info(f"⏳ Building labels for {job['count']} storages...")
+        st.button("🔄 Check Progress", key="label_progress")
+    elif job['status'] == 'done':
+        st.download_button(
+            label=f"📥 Download Labels ({job['count']} storages)",
+            data=job['data'],
+            file_name=f"drone_lab_labels.{'pdf' if job['format'] == 'pdf' else 'zip'}",
+            mime="application/pdf" if job['format'] == 'pdf' else "application/zip",
+            use_container_width=True,
+            key="dl_labels"
+        )
+    else:
+        st.error(f"Label sheet error: {job['error']}")
 
 def add_storage_view():
     st.title("🏗️ Add New Storage")
@@ -383,7 +2232,7 @@ def add_storage_view():
         if st.form_submit_button("🏗️ Create Storage", use_container_width=True):
             if name and location:
                 storage_id = f"storage_{generate_id()}"
-                inventory['storages'][storage_id] = {
+                new_storage = {
                     'id': storage_id,
                     'name': name,
                     'location': location,
@@ -392,46 +2241,55 @@ def add_storage_view():
                     'items': [],
                     'last_updated': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                 }
-                if auto_save():
+                if auto_save('add_storage', storage=new_storage):
                     st.session_state.ui_state['current_view'] = 'dashboard'
                     st.success(f"✅ Storage '{name}' created successfully!")
                     st.rerun()
 
 def edit_storage_view():
     storage_id = st.session_state.ui_state['selected_storage']
-    storage = inventory['storages'][storage_id]
+    storage = inventory['storages'].get(storage_id)
     
-    st.title(f"⚙️ Manage {storage['name']}")
+    st.title(f"⚙️ Manage {storage['name']}" if storage else "⚙️ Manage Storage")
     if st.button("← Back to Dashboard"):
         st.session_state.ui_state['current_view'] = 'dashboard'
         st.session_state.ui_state['selected_storage'] = None
         st.rerun()
+    if storage is None:
+        st.warning("⚠️ This storage was deleted on another device.")
+        return
     
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("Storage Details")
+        # Keep the form on the values editing started from - a concurrent save must not reset it
+        base = st.session_state.ui_state.get('edit_base') or get_edit_base(storage)
+        form_storage = base['fields']
         with st.form("edit_storage_form"):
-            name = st.text_input("Name*", value=storage['name'])
-            location = st.text_input("Location*", value=storage['location'])
+            name = st.text_input("Name*", value=form_storage['name'])
+            location = st.text_input("Location*", value=form_storage['location'])
             storage_type = st.selectbox("Type*", inventory['storage_types'], 
-                                      index=inventory['storage_types'].index(storage['type']))
-            description = st.text_area("Description", value=storage.get('description', ''))
+                                      index=inventory['storage_types'].index(form_storage['type']))
+            description = st.text_area("Description", value=form_storage.get('description', ''))
             
             if st.form_submit_button("💾 Save Changes", use_container_width=True):
                 if name and location:
-                    storage.update({
+                    changes = {
                         'name': name, 
                         'location': location, 
                         'type': storage_type, 
-                        'description': description,
-                        'last_updated': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    })
-                    if auto_save():
+                        'description': description
+                    }
+                    if auto_save('update_storage', base=base, storage_id=storage_id, changes=changes):
                         st.session_state.ui_state['current_view'] = 'dashboard'
                         st.session_state.ui_state['selected_storage'] = None
+                        st.session_state.ui_state['edit_base'] = None
                         st.success("✅ Storage updated successfully!")
                         st.rerun()
+                    elif storage_id in inventory['storages']:
+                        # Rebase on what is stored now so a resubmit is deliberate
+                        st.session_state.ui_state['edit_base'] = get_edit_base(inventory['storages'][storage_id])
     
     with col2:
         st.subheader("Danger Zone")
@@ -440,8 +2298,7 @@ def edit_storage_view():
         # SIMPLE DELETE - No confirmation conflicts
         if st.button("🗑️ Delete This Storage", type="secondary", use_container_width=True, key="delete_storage_final"):
             storage_name = storage['name']
-            del inventory['storages'][storage_id]
-            if auto_save():
+            if auto_save('delete_storage', storage_id=storage_id):
                 st.session_state.ui_state['current_view'] = 'dashboard'
                 st.session_state.ui_state['selected_storage'] = None
                 st.success(f"✅ Storage '{storage_name}' deleted successfully!")
@@ -449,72 +2306,525 @@ def edit_storage_view():
 
 def add_item_view():
     storage_id = st.session_state.ui_state['selected_storage']
-    storage = inventory['storages'][storage_id]
+    storage = inventory['storages'].get(storage_id)
     
-    st.title(f"➕ Add Item to {storage['name']}")
+    st.title(f"➕ Add Item to {storage['name']}" if storage else "➕ Add Item")
     if st.button("← Back to Dashboard"):
         st.session_state.ui_state['current_view'] = 'dashboard'
         st.session_state.ui_state['selected_storage'] = None
         st.rerun()
+    if storage is None:
+        st.warning("⚠️ This storage was deleted on another device.")
+        return
     
     with st.form("add_item_form"):
         name = st.text_input("Item Name*", placeholder="e.g., DJI Mavic 3")
-        quantity = st.text_input("Quantity*", placeholder="e.g., 2 units")
+        col_count, col_unit, col_min = st.columns(3)
+        with col_count:
+            count = st.number_input("Quantity*", min_value=0.0, value=1.0, step=1.0, format="%g")
+        with col_unit:
+            unit = st.text_input("Unit", value="units", placeholder="e.g., units, pairs, packs")
+        with col_min:
+            min_stock = st.number_input("Reorder below", min_value=0.0, value=0.0, step=1.0, format="%g",
+                                        help="Flag the item as low stock when the quantity drops below this (0 = never)")
         category = st.selectbox("Category", inventory['categories'])
         status = st.selectbox("Status", inventory['status_options'])
         
         if st.form_submit_button("➕ Add Item", use_container_width=True):
-            if name and quantity:
-                storage['items'].append({
+            if name:
+                new_item = {
                     'id': f"item_{generate_id()}",
                     'name': name, 
-                    'quantity': quantity, 
+                    'count': normalize_count(count), 
+                    'unit': unit.strip() or 'units', 
+                    'min_stock': normalize_count(min_stock), 
                     'category': category, 
                     'status': status
-                })
-                storage['last_updated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                if auto_save():
+                }
+                if auto_save('add_item', storage_id=storage_id, item=new_item):
                     st.session_state.ui_state['current_view'] = 'dashboard'
                     st.session_state.ui_state['selected_storage'] = None
                     st.success(f"✅ Item '{name}' added successfully!")
                     st.rerun()
 
 def edit_item_view():
-    storage_id = st.session_state.ui_state['selected_storage']
-    item_index = st.session_state.ui_state['selected_item']
-    storage = inventory['storages'][storage_id]
-    item = storage['items'][item_index]
+    storage, item = locate_item(st.session_state.ui_state['selected_item'])
     
-    st.title(f"✏️ Edit Item in {storage['name']}")
+    st.title(f"✏️ Edit Item in {storage['name']}" if storage else "✏️ Edit Item")
     if st.button("← Back to Dashboard"):
         st.session_state.ui_state['current_view'] = 'dashboard'
         st.session_state.ui_state['selected_storage'] = None
         st.session_state.ui_state['selected_item'] = None
         st.rerun()
+    if item is None:
+        st.warning("⚠️ This item was deleted on another device.")
+        return
+    # Moved on another device - keep editing it where it is now
+    storage_id = st.session_state.ui_state['selected_storage'] = storage['id']
+    
+    # Keep the form on the values editing started from - a concurrent save must not reset it
+    base = st.session_state.ui_state.get('edit_base') or get_edit_base(storage, item)
+    form_item = base['fields']
     
     with st.form("edit_item_form"):
-        name = st.text_input("Item Name*", value=item['name'])
-        quantity = st.text_input("Quantity*", value=item['quantity'])
+        name = st.text_input("Item Name*", value=form_item['name'])
+        col_count, col_unit, col_min = st.columns(3)
+        with col_count:
+            count = st.number_input("Quantity*", min_value=0.0, value=float(form_item.get('count', 0)),
+                                    step=1.0, format="%g")
+        with col_unit:
+            unit = st.text_input("Unit", value=form_item.get('unit', 'units'))
+        with col_min:
+            min_stock = st.number_input("Reorder below", min_value=0.0, value=float(form_item.get('min_stock', 0)),
+                                        step=1.0, format="%g",
+                                        help="Flag the item as low stock when the quantity drops below this (0 = never)")
         category = st.selectbox("Category", inventory['categories'],
-                              index=inventory['categories'].index(item.get('category', 'Other')))
+                              index=inventory['categories'].index(form_item.get('category', 'Other')))
         status = st.selectbox("Status", inventory['status_options'],
-                            index=inventory['status_options'].index(item['status']))
+                            index=inventory['status_options'].index(form_item['status']))
+        user = st.text_input("👤 Your name", value=st.session_state.ui_state.get('user') or '',
+                             help="Recorded with status changes in the item history - who checked it out or back in")
         
         if st.form_submit_button("💾 Save Changes", use_container_width=True):
-            if name and quantity:
-                item.update({
+            st.session_state.ui_state['user'] = user.strip() or None
+            if name:
+                changes = {
                     'name': name, 
-                    'quantity': quantity, 
+                    'count': normalize_count(count), 
+                    'unit': unit.strip() or 'units', 
+                    'min_stock': normalize_count(min_stock), 
                     'category': category, 
                     'status': status
-                })
-                storage['last_updated'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                if auto_save():
+                }
+                if auto_save('update_item', base=base, storage_id=storage_id, item_id=item['id'], changes=changes):
                     st.session_state.ui_state['current_view'] = 'dashboard'
                     st.session_state.ui_state['selected_storage'] = None
                     st.session_state.ui_state['selected_item'] = None
+                    st.session_state.ui_state['edit_base'] = None
                     st.success("✅ Item updated successfully!")
                     st.rerun()
+                elif storage_id in inventory['storages']:
+                    # Rebase on what is stored now so a resubmit is deliberate
+                    st.session_state.ui_state['edit_base'] = get_edit_base(inventory['storages'][storage_id], item)
+    
+    # Moving re-files the one item - the storages' other items are left as they are
+    st.markdown("---")
+    st.subheader("📦 Move to Another Storage")
+    storages = copy_storages()
+    targets = [other_id for other_id in storages if other_id != storage_id]
+    if not targets:
+        st.info("Add another storage to move items into")
+        return
+    with st.form("move_item_form"):
+        to_storage_id = st.selectbox("Move to", targets,
+                                     format_func=lambda other_id: f"{storages[other_id]['name']} "
+                                                                  f"({storages[other_id].get('location', '')})")
+        if st.form_submit_button("📦 Move Item", use_container_width=True):
+            if auto_save('move_item', storage_id=storage_id, item_id=item['id'], to_storage_id=to_storage_id):
+                st.session_state.ui_state['current_view'] = 'dashboard'
+                st.session_state.ui_state['selected_storage'] = None
+                st.session_state.ui_state['selected_item'] = None
+                st.session_state.ui_state['edit_base'] = None
+                st.success(f"✅ Moved to {storages[to_storage_id]['name']}")
+                st.rerun()
+
+def import_export_view():
+    """Bulk item import from CSV/Excel and full-inventory export"""
+    import bulk_io
+    st.title("📥 Import / Export Items")
+    if st.button("← Back to Dashboard"):
+        st.session_state.ui_state['current_view'] = 'dashboard'
+        st.session_state.ui_state['import_batch'] = None
+        st.session_state.ui_state['export_file'] = None
+        st.rerun()
+    
+    formats = bulk_io.supported_formats()
+    st.subheader("Import")
+    st.caption("One row per item: storage (name or storage_id), name, count, unit, min_stock, category, status. "
+               "Every row needs a count - write 0 for none; a row without one is reported, not imported. "
+               "Storages that do not exist yet are created, using the location and type columns.")
+    upload = st.file_uploader("Item list", type=formats, key="import_file")
+    if upload is None:
+        st.session_state.ui_state['import_batch'] = None
+    else:
+        batch = st.session_state.ui_state.get('import_batch')
+        if batch is None or batch['file_id'] != upload.file_id:
+            try:
+                rows = bulk_io.iter_rows(upload, upload.name.rsplit('.', 1)[-1].lower())
+                storages, items, errors = build_import_batch(rows, dict(inventory, storages=copy_storages()))
+            except Exception as e:
+                st.error(f"Import error: {e}")
+                return
+            batch = {'file_id': upload.file_id, 'storages': storages, 'items': items, 'errors': errors,
+                     'imported': False}
+            st.session_state.ui_state['import_batch'] = batch
+        
+        if batch['imported']:
+            st.success(f"✅ Imported {batch['imported']} items from {upload.name}")
+        else:
+            target_count = len({storage_id for storage_id, _ in batch['items']})
+            st.write(f"**{len(batch['items'])}** items ready for {target_count} storages "
+                     f"({len(batch['storages'])} new)")
+            if batch['errors']:
+                st.warning(f"⚠️ {len(batch['errors'])} rows will be skipped")
+                st.dataframe([{'Row': number, 'Problem': problem}
+                              for number, problem in batch['errors'][:IMPORT_ERRORS_SHOWN]],
+                             hide_index=True, use_container_width=True)
+            if st.button(f"📥 Import {len(batch['items'])} Items", disabled=not batch['items'],
+                         use_container_width=True):
+                # The whole file is one journaled change - one write, one refresh for every session
+                if auto_save('import_items', storages=batch['storages'], items=batch['items']):
+                    st.session_state.ui_state['import_batch'] = {'file_id': upload.file_id,
+                                                                 'imported': len(batch['items'])}
+                    st.rerun()
+    
+    st.markdown("---")
+    st.subheader("Export")
+    fmt = st.radio("Format", [f.upper() for f in formats + ['json']], horizontal=True, key="export_format",
+                   help="JSON: the whole inventory as an inventory_data.json file, whichever storage backend is in use").lower()
+    if st.button("📤 Prepare Export", use_container_width=True):
+        try:
+            st.session_state.ui_state['export_file'] = (fmt, export_inventory(fmt))
+        except Exception as e:
+            st.error(f"Export error: {e}")
+    export = st.session_state.ui_state.get('export_file')
+    if export:
+        export_fmt, data = export
+        st.download_button(
+            label=f"📥 Download {export_fmt.upper()}",
+            data=data,
+            file_name=f"drone_lab_inventory.{export_fmt}",
+            mime={'csv': "text/csv", 'json': "application/json"}.get(
+                export_fmt, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+            use_container_width=True,
+            key="dl_export"
+        )
+
+def history_view():
+    """Status changes and moves over a period, who had an item, and time spent per status"""
+    st.title("📜 Item History")
+    if st.button("← Back to Dashboard"):
+        st.session_state.ui_state['current_view'] = 'dashboard'
+        st.rerun()
+    
+    ledger = get_ledger(lab)
+    
+    today = datetime.now().date()
+    dates = st.date_input("Period", value=(today - timedelta(days=7), today), max_value=today, key="history_dates")
+    if len(dates) != 2:
+        st.info("Pick the last day of the period")
+        return
+    start = int(datetime.combine(dates[0], datetime.min.time()).timestamp())
+    end = int(datetime.combine(dates[1] + timedelta(days=1), datetime.min.time()).timestamp())
+    end = min(end, int(datetime.now().timestamp()) + 1)  # today's periods run up to now
+    
+    item_id = None
+    query = st.text_input("Item", placeholder="Search for one item, or leave empty for all", key="history_search")
+    if query:
+        matches, _ = search_items(query)
+        if not matches:
+            st.info("No matching items")
+            return
+        labels = {item['id']: f"{item['name']} → 📦 {storage['name']}" for storage, item in matches}
+        item_id = st.selectbox("Matching items", list(labels), format_func=labels.get, key="history_item")
+    
+    storage_names = {storage_id: storage['name'] for storage_id, storage in copy_storages().items()}
+    time_format = "%Y-%m-%d %H:%M"
+    
+    st.subheader("Changes")
+    events = ledger.history(start, end, item_id, HISTORY_EVENTS_SHOWN)
+    if events:
+        st.dataframe([{
+            'Time': datetime.fromtimestamp(ts).strftime(time_format),
+            'Item': name or event_item_id,
+            'Change': describe_history_event(kind, old, new, storage_names),
+            'Storage': storage_names.get(storage_id, storage_id),
+            'By': user or ''
+        } for ts, event_item_id, name, kind, old, new, storage_id, user in events],
+            hide_index=True, use_container_width=True)
+        if len(events) == HISTORY_EVENTS_SHOWN:
+            st.caption(f"Latest {HISTORY_EVENTS_SHOWN} changes shown - narrow the period or pick an item for more")
+    else:
+        st.info("No changes in this period")
+    
+    if item_id is not None:
+        st.subheader("🔴 Who Had It")
+        periods = ledger.periods(start, end, item_id, status='In Use')
+        if periods:
+            st.dataframe([{
+                'From': datetime.fromtimestamp(period_start).strftime(time_format),
+                'To': datetime.fromtimestamp(period_end).strftime(time_format) if period_end < end else 'ongoing',
+                'By': user or 'unknown',
+                'Hours': round((period_end - period_start) / 3600, 1)
+            } for _, _, _, _, _, user, period_start, period_end in sorted(periods, key=lambda row: row[6])],
+                hide_index=True, use_container_width=True)
+        else:
+            st.info("Not in use during this period")
+    
+    st.subheader("⏱️ Time per Status")
+    report = ledger.utilization(start, end)
+    if not report:
+        st.info("No items tracked in this period")
+        return
+    category_totals = {}
+    for (category, _), (seconds, _, _) in report.items():
+        category_totals[category] = category_totals.get(category, 0) + seconds
+    st.dataframe([{
+        'Category': category,
+        'Status': status,
+        'Items': items,
+        'Total hours': round(seconds / 3600, 1),
+        'Avg hours per stretch': round(seconds / stretches / 3600, 1),
+        'Share': f"{seconds * 100 // max(category_totals[category], 1)}%"
+    } for (category, status), (seconds, stretches, items) in sorted(report.items(), key=lambda row: (str(row[0][0]), row[0][1]))],
+        hide_index=True, use_container_width=True)
+
+def admin_unlocked():
+    """Whether this session entered INVENTORY_ADMIN_KEY - asks for it when not"""
+    if not ADMIN_KEY:
+        st.info("Admin views are disabled - set INVENTORY_ADMIN_KEY on the server to enable them")
+        return False
+    if st.session_state.ui_state.get('admin'):
+        return True
+    with st.form("admin_unlock"):
+        key = st.text_input("Admin key", type="password")
+        if st.form_submit_button("🔓 Unlock"):
+            if hmac.compare_digest(key.encode('utf-8'), ADMIN_KEY.encode('utf-8')):
+                st.session_state.ui_state['admin'] = True
+                st.rerun()
+            st.error("Wrong admin key")
+    return False
+
+def diagnostics_view():
+    """Admin only - rerun latency per view, the costliest code paths and cache/save counters"""
+    st.title("🩺 Diagnostics")
+    if st.button("← Back to Dashboard"):
+        st.experimental_set_query_params(**lab_query())
+        st.session_state.ui_state['current_view'] = 'dashboard'
+        st.rerun()
+    if not admin_unlocked():
+        return
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        enabled = st.toggle("Collect timings", value=diagnostics.enabled,
+                            help="Shared by the whole server - switch off when done, nothing is timed while off")
+        if enabled != diagnostics.enabled:
+            diagnostics.enabled = enabled
+            st.rerun()
+    with col2:
+        if st.button("🗑️ Reset", use_container_width=True):
+            diagnostics.reset()
+            st.rerun()
+    snapshot = diagnostics.snapshot()
+    st.caption(f"Collected since {datetime.fromtimestamp(snapshot['since']).strftime('%Y-%m-%d %H:%M:%S')}"
+               + (f" | also written to {DIAGNOSTICS_FILE} every {DIAGNOSTICS_EXPORT_INTERVAL} s" if DIAGNOSTICS_FILE else ""))
+    if not snapshot['spans'] and not snapshot['counters']:
+        st.info("Nothing recorded yet - switch on \"Collect timings\" and use the app")
+        return
+    
+    def ms(seconds):
+        return round(seconds * 1000, 1)
+    
+    st.subheader("⏱️ Rerun Latency")
+    st.dataframe([{
+        'View': name.split('.', 1)[1],
+        'Runs': span['calls'],
+        'p50 ms': ms(span['p50']),
+        'p90 ms': ms(span['p90']),
+        'p99 ms': ms(span['p99']),
+        'Max ms': ms(span['max'])
+    } for name, span in snapshot['spans'].items() if name.startswith('rerun.')],
+        hide_index=True, use_container_width=True)
+    
+    st.subheader("🔥 Top Costs")
+    st.dataframe([{
+        'Path': name,
+        'Calls': span['calls'],
+        'Total s': round(span['seconds'], 2),
+        'p50 ms': ms(span['p50']),
+        'p99 ms': ms(span['p99']),
+        'Max ms': ms(span['max'])
+    } for name, span in snapshot['spans'].items() if not name.startswith('rerun.')],
+        hide_index=True, use_container_width=True)
+    
+    st.subheader("🔢 Counters")
+    counters = snapshot['counters']
+    qr_hits = counters.get('qr.cache.memory_hits', 0) + counters.get('qr.cache.disk_hits', 0)
+    qr_lookups = qr_hits + counters.get('qr.cache.misses', 0)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("QR Cache Hit Rate", f"{qr_hits * 100 // qr_lookups}%" if qr_lookups else "-")
+    with col2:
+        st.metric("Full Reloads", counters.get('inventory.reloads', 0))
+    with col3:
+        st.metric("Saved", f"{counters.get('save.bytes', 0) / 1024:.1f} KB")
+    st.dataframe([{'Counter': name, 'Value': value} for name, value in sorted(counters.items())],
+                 hide_index=True, use_container_width=True)
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button("📥 JSON", data=diagnostics.to_json(), file_name="inventory_diagnostics.json",
+                           mime="application/json", use_container_width=True)
+    with col2:
+        st.download_button("📥 Prometheus", data=diagnostics.to_prometheus(), file_name="inventory_diagnostics.prom",
+                           mime="text/plain", use_container_width=True)
+
+def backups_view():
+    """Admin only - what the backups hold, and restoring the inventory as it was at any moment they cover"""
+    st.title("🗄️ Backups")
+    if st.button("← Back to Dashboard"):
+        st.experimental_set_query_params(**lab_query())
+        st.session_state.ui_state['current_view'] = 'dashboard'
+        st.rerun()
+    if not admin_unlocked():
+        return
+    
+    worker = get_backup_worker(lab)
+    if st.button("💾 Back Up Now", use_container_width=True):
+        if worker.back_up():
+            st.success("✅ Backed up")
+        else:
+            st.warning("⚠️ Another server process is backing up right now - try again shortly")
+    fulls, segments = worker.backups.catalog()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Full Snapshots", len(fulls))
+    with col2:
+        st.metric("Change Sets", len(segments))
+    with col3:
+        st.metric("Size", f"{sum(backup['bytes'] for backup in fulls + segments) / 2**20:.1f} MB")
+    st.caption(f"Backed up every {BACKUP_INTERVAL // 60} min into {lab_file(lab, BACKUP_DIR)}/ - kept {BACKUP_KEEP_DAYS:g} days, "
+               f"up to {BACKUP_MAX_MB:g} MB")
+    
+    span = worker.backups.span()
+    if span is None:
+        st.info(f"No backups yet - the first one is taken within {BACKUP_INTERVAL // 60} minutes")
+        return
+    st.dataframe([{
+        'Taken': datetime.fromtimestamp(full['ts']).strftime("%Y-%m-%d %H:%M:%S"),
+        'Changes up to': f"#{full['last']}",
+        'Size KB': round(full['bytes'] / 1024, 1)
+    } for full in reversed(fulls)], hide_index=True, use_container_width=True)
+    
+    st.subheader("⏪ Restore")
+    oldest, newest = (datetime.fromtimestamp(ts) for ts in span)
+    st.caption(f"Any moment from {oldest:%Y-%m-%d %H:%M:%S} to {newest:%Y-%m-%d %H:%M:%S} can be restored")
+    col1, col2 = st.columns(2)
+    with col1:
+        day = st.date_input("Day", value=newest.date(), min_value=oldest.date(), max_value=newest.date(),
+                            key="restore_day")
+    with col2:
+        moment = st.time_input("Time", value=newest.time(), step=60, key="restore_time")
+    at = datetime.combine(day, moment).replace(second=59).timestamp()
+    if st.button("🔍 Preview", use_container_width=True):
+        st.session_state.ui_state['restore_preview'] = (at, worker.backups.restore(at, apply_change))
+    preview = st.session_state.ui_state.get('restore_preview')
+    if preview is None or preview[0] != at:
+        return
+    restored = preview[1]
+    if restored is None:
+        st.warning(f"⚠️ Nothing was backed up that early - the oldest backup is from {oldest:%Y-%m-%d %H:%M}")
+        return
+    stats = get_stats(restored)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Storage Units", len(restored['storages']),
+                  len(restored['storages']) - len(inventory['storages']) or None)
+    with col2:
+        st.metric("Total Items", stats['items'], stats['items'] - get_stats(inventory)['items'] or None)
+    with col3:
+        st.metric("Available", stats['by_status'].get('Available', 0))
+    st.warning("⚠️ Restoring replaces the inventory on every device. The current state is backed up first, "
+               "so a restore can be undone the same way")
+    if st.button("⏪ Restore This Version", type="primary", use_container_width=True):
+        try:
+            restore_inventory(restored, st.session_state.ui_state.get('user'))
+        except Exception as e:
+            st.error(f"Restore error: {e}")
+            return
+        st.session_state.ui_state.pop('restore_preview', None)
+        st.success(f"✅ Restored the inventory as of {datetime.fromtimestamp(at):%Y-%m-%d %H:%M}")
+
+def get_lab_summary(lab_id):
+    """One lab's roll-up counters - live when this process has the lab loaded, else read from its
+    shard without loading it"""
+    store = get_inventory_store(lab_id)
+    with store['lock']:
+        if store['data'] is not None:
+            refresh_inventory(store)
+            return dict(summarize_inventory(store['data']), pending=0)
+    return get_backend(lab_id).summary()
+
+def labs_view():
+    """Admin only - every lab's counters side by side, one shard at a time, and adding labs"""
+    st.title("🏢 Labs")
+    if st.button("← Back to Dashboard"):
+        st.experimental_set_query_params(**lab_query())
+        st.session_state.ui_state['current_view'] = 'dashboard'
+        st.rerun()
+    if not admin_unlocked():
+        return
+    
+    summaries = {}
+    for lab_id in list_labs():
+        try:
+            summaries[lab_id] = get_lab_summary(lab_id)
+        except Exception as e:
+            st.error(f"{get_lab_name(lab_id)}: {e}")
+    statuses = list(dict.fromkeys(status for summary in summaries.values() for status in summary['by_status']))
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Labs", len(summaries))
+    with col2:
+        st.metric("Storage Units", sum(summary['storages'] for summary in summaries.values()))
+    with col3:
+        st.metric("Total Items", sum(summary['items'] for summary in summaries.values()))
+    
+    app_url = get_app_url()
+    st.dataframe([{
+        'Lab': get_lab_name(lab_id),
+        'Storages': summary['storages'],
+        'Items': summary['items'],
+        **{status: summary['by_status'].get(status, 0) for status in statuses},
+        'Low stock': summary['low_stock'],
+        'Pending': summary['pending'],
+        'Open': f"{app_url}?{urlencode({'lab': lab_id})}" if lab_id != DEFAULT_LAB else app_url
+    } for lab_id, summary in summaries.items()], hide_index=True, use_container_width=True,
+        column_config={'Open': st.column_config.LinkColumn("Open")})
+    st.caption("Labs this server has not loaded are counted from their latest snapshot - Pending is the "
+               "number of changes made since, which the counts do not include yet")
+    
+    st.subheader("🗂️ Items by Category")
+    categories = {}
+    for summary in summaries.values():
+        for category, count in summary['by_category'].items():
+            categories[category] = categories.get(category, 0) + count
+    st.dataframe([{'Category': category, 'Items': count} for category, count in
+                  sorted(categories.items(), key=lambda row: -row[1])], hide_index=True, use_container_width=True)
+    
+    st.subheader("➕ Add Lab")
+    with st.form("add_lab"):
+        lab_id = st.text_input("Lab ID", placeholder="e.g. robotics - used in the lab's links and QR codes")
+        name = st.text_input("Name", placeholder="e.g. Robotics Lab")
+        if st.form_submit_button("🏗️ Create Lab"):
+            lab_id = lab_id.strip().lower()
+            if not LAB_ID.match(lab_id):
+                st.error("Use up to 32 lowercase letters, digits, - and _")
+            elif lab_exists(lab_id):
+                st.error(f"Lab '{lab_id}' already exists")
+            else:
+                try:
+                    create_lab(lab_id, name.strip() or lab_id)
+                    st.success(f"✅ Created - open it at {app_url}?{urlencode({'lab': lab_id})}")
+                except OSError as e:
+                    st.error(f"Could not create the lab: {e}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Timed under the view the run started on - st.rerun() and st.stop() still end up here
+    started_view = (st.experimental_get_query_params().get("view", [None])[0]
+                    or st.session_state.ui_state['current_view'])
+    try:
+        main()
+    finally:
+        finish_rerun(started_view)
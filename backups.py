@@ -0,0 +1,120 @@
+# backups.py - versioned inventory backups: compressed full snapshots plus the changes in between
+# A full snapshot is the gzipped inventory as of one journal sequence number; a change segment holds
+# the gzipped journal records that followed it. Any moment still inside the retention window is
+# rebuilt from the newest full snapshot before it plus the changes up to it.
+import gzip
+import json
+import os
+import re
+import time
+
+from storage_io import file_lock, write_atomic
+
+FULL_NAME = re.compile(r'^full-(\d+)-(\d+)\.json\.gz$')  # full-<seq>-<unix time taken>
+CHANGES_NAME = re.compile(r'^changes-(\d+)-(\d+)-(\d+)\.jsonl\.gz$')  # changes-<first seq>-<last seq>-<unix time of last>
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"  # journal record 'ts'
+COMPRESS_LEVEL = 6
+
+def entry_time(entry):
+    """Unix time of a journal record - its 'ts' is local time"""
+    return time.mktime(time.strptime(entry['ts'], TS_FORMAT))
+
+class Backups:
+    """One directory of full snapshots and change segments"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def lock(self, blocking=True):
+        """Exclusive across processes - yields False instead of waiting when blocking is off"""
+        return file_lock(os.path.join(self.directory, '.lock'), blocking)
+
+    def catalog(self):
+        """(full snapshots, change segments), oldest first - dicts of path, seq range, unix time and bytes"""
+        fulls, segments = [], []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            match = FULL_NAME.match(name)
+            if match:
+                seq, ts = map(int, match.groups())
+                fulls.append({'path': path, 'first': seq, 'last': seq, 'ts': ts, 'bytes': os.path.getsize(path)})
+                continue
+            match = CHANGES_NAME.match(name)
+            if match:
+                first, last, ts = map(int, match.groups())
+                segments.append({'path': path, 'first': first, 'last': last, 'ts': ts,
+                                 'bytes': os.path.getsize(path)})
+        key = lambda backup: (backup['last'], backup['ts'])
+        return sorted(fulls, key=key), sorted(segments, key=key)
+
+    def archived_seq(self):
+        """Sequence number of the newest record backed up - -1 before the first full snapshot"""
+        fulls, segments = self.catalog()
+        if not fulls:
+            return -1
+        return max([fulls[-1]['last']] + [segment['last'] for segment in segments])
+
+    def write_atomic(self, name, payload):
+        return write_atomic(os.path.join(self.directory, name), payload)
+
+    def write_full(self, data, ts=None):
+        """Back up the whole inventory - bytes written"""
+        payload = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return self.write_atomic(f"full-{data.get('journal_seq', 0):012d}-{int(ts or time.time())}.json.gz",
+                                 gzip.compress(payload, COMPRESS_LEVEL))
+
+    def write_changes(self, entries):
+        """Back up journal records that follow the newest backup - bytes written"""
+        payload = ''.join(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n' for entry in entries)
+        name = f"changes-{entries[0]['seq']:012d}-{entries[-1]['seq']:012d}-{int(entry_time(entries[-1]))}.jsonl.gz"
+        return self.write_atomic(name, gzip.compress(payload.encode('utf-8'), COMPRESS_LEVEL))
+
+    def prune(self, keep_seconds, max_bytes, now=None):
+        """Drop the oldest full snapshot, with the changes up to the next one, while the next one still
+        covers the whole time window or everything takes more than max_bytes. The newest full snapshot
+        and the changes after it always stay. Returns the number of files removed"""
+        now = time.time() if now is None else now
+        fulls, segments = self.catalog()
+        removed = 0
+        while len(fulls) > 1:
+            total = sum(backup['bytes'] for backup in fulls + segments)
+            if fulls[1]['ts'] > now - keep_seconds and total <= max_bytes:
+                break
+            dropped = [fulls.pop(0)] + [segment for segment in segments if segment['last'] <= fulls[0]['last']]
+            segments = [segment for segment in segments if segment['last'] > fulls[0]['last']]
+            for backup in dropped:
+                os.remove(backup['path'])
+            removed += len(dropped)
+        return removed
+
+    def span(self):
+        """(oldest, newest) unix time that can be restored - None without backups"""
+        fulls, segments = self.catalog()
+        if not fulls:
+            return None
+        newest = max([fulls[-1]['ts']] + [segment['ts'] for segment in segments if segment['last'] > fulls[-1]['last']])
+        return fulls[0]['ts'], newest
+
+    def restore(self, at, apply):
+        """The inventory as it was at unix time at - the newest full snapshot taken by then, with the
+        change records up to that moment replayed through apply(data, entry). None when no full
+        snapshot is that old"""
+        fulls, segments = self.catalog()
+        base = [full for full in fulls if full['ts'] <= at]
+        if not base:
+            return None
+        with gzip.open(base[-1]['path'], 'rb') as f:
+            data = json.loads(f.read())
+        for segment in segments:
+            if segment['last'] <= data.get('journal_seq', 0):
+                continue
+            with gzip.open(segment['path'], 'rt', encoding='utf-8') as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if entry['seq'] <= data.get('journal_seq', 0):
+                        continue
+                    if entry_time(entry) > at:
+                        return data  # records are in commit order - the rest are later still
+                    apply(data, entry)
+        return data
@@ -0,0 +1,380 @@
+# benchmark.py - timings for the inventory data paths on synthetic inventories
+# Run: python benchmark.py [--sizes 10x1,1000x50] [--backends json,sqlite] [--output FILE] [--compare OLD_FILE]
+# Every case runs in a fresh process inside a scratch directory, so the real data files are never touched.
+# Results are written as JSON - one row per (backend, size, scenario) - to compare revisions.
+import argparse
+import inspect
+import json
+import multiprocessing as mp
+import os
+import platform
+import queue
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import streamlit.logger
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_FILE = os.path.join(APP_DIR, 'app.py')
+DEFAULT_SIZES = '10x1,1000x50,10000x500,100000x5000'  # items x storages
+MUTATIONS = 30       # commit_change calls timed per change kind
+QR_CODES = 20        # payloads per QR scenario
+STRESS_PROCESSES = 6
+STRESS_ADDS = 60     # item adds per stress process
+SLOWER_RATIO = 1.25  # --compare flags medians that grew by more than this
+COMPARE_FLOOR = 0.001  # seconds - faster medians are mostly timer noise and never flagged
+
+ITEM_NAMES = ['DJI Mavic 3 Pro', 'LiPo Battery 4S', 'FPV Controller', 'Carbon Propeller Set', 'GoPro Hero',
+              'Lidar Sensor', 'Balance Charger', 'Soldering Iron', 'ESC 40A', 'GPS Module', 'Flight Controller',
+              'Gimbal', 'Receiver', 'Video Transmitter', 'Hex Key Set', 'Zip Ties']
+STORAGE_NAMES = ['Cabinet', 'Shelf', 'Drawer', 'Rack', 'Toolbox', 'Bin']
+UNITS = ['units', 'pairs', 'sets', 'packs']
+
+# SETUP - the app imported the way a server process holds it
+def load_app(backend_kind):
+    """Import app.py in the current directory with the given storage backend"""
+    os.environ['INVENTORY_BACKEND'] = backend_kind
+    sys.path.insert(0, APP_DIR)
+    # Streamlit's own loggers only - "missing ScriptRunContext" warnings outside `streamlit run`
+    streamlit.logger.set_log_level('error')
+    import app
+    # st.cache_resource doesn't cache outside `streamlit run` - keep one of each, as a server does
+    for name in ('get_inventory_store', 'get_backend', 'get_qr_cache', 'get_qr_pool', 'get_ledger'):
+        setattr(app, name, pin_resource(getattr(app, name)))
+    return app
+
+def pin_resource(factory):
+    """One resource per set of arguments, defaults filled in - per lab and backend kind, as
+    st.cache_resource keeps them"""
+    signature = inspect.signature(factory)
+    resources = {}
+    def get(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = tuple(bound.arguments.items())
+        if key not in resources:
+            resources[key] = factory(*args, **kwargs)
+        return resources[key]
+    return get
+
+def make_item(rng, data, number):
+    return {'id': f'item_{number}', 'name': f'{rng.choice(ITEM_NAMES)} #{number}',
+            'count': rng.randint(0, 40), 'unit': rng.choice(UNITS), 'min_stock': rng.choice([0, 0, 0, 2, 5]),
+            'status': rng.choice(data['status_options']), 'category': rng.choice(data['categories'])}
+
+def make_inventory(app, item_count, storage_count, seed=0):
+    """Synthetic inventory - items spread evenly over the storages, with saved counters"""
+    rng = random.Random(seed)
+    data = app.get_default_inventory()
+    data['storages'] = {}
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for number in range(1, storage_count + 1):
+        storage_id = f'storage_{number}'
+        data['storages'][storage_id] = {
+            'id': storage_id, 'name': f'{rng.choice(STORAGE_NAMES)} {number}',
+            'type': rng.choice(data['storage_types']), 'location': f'Drone Lab AIC - Room {rng.randint(1, 40)}',
+            'description': '', 'items': [], 'last_updated': now}
+    storages = list(data['storages'].values())
+    for number in range(1, item_count + 1):
+        storages[number % storage_count]['items'].append(make_item(rng, data, number))
+    app.build_stats(data)
+    return data
+
+# TIMING
+def summarize(samples):
+    return {'min': min(samples), 'median': statistics.median(samples), 'max': max(samples), 'runs': len(samples)}
+
+def timed(fn, repeat=1):
+    """Seconds per call over repeat calls"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+def timed_each(fn, args_list):
+    """Seconds per call, one call per argument tuple"""
+    samples = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+def loaded_memory(backend):
+    """MB of Python heap a freshly loaded inventory holds - traced separately from the timed loads"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        data = backend.load()
+        return (tracemalloc.get_traced_memory()[0] - before) / 2**20
+    finally:
+        del data
+        tracemalloc.stop()
+
+def random_item(rng, data):
+    storage = rng.choice([s for s in data['storages'].values() if s['items']])
+    return storage['id'], rng.choice(storage['items'])
+
+# SCENARIOS - each runs in its own process and scratch directory
+def data_paths_case(backend_kind, item_count, storage_count):
+    """Parse, save, mutation + save, aggregates and search for one backend and size"""
+    app = load_app(backend_kind)
+    backend = app.get_backend()
+    data = make_inventory(app, item_count, storage_count)
+    rng = random.Random(1)
+    results = {}
+    if backend_kind == 'compact' and not isinstance(backend, app.CompactBackend):
+        raise RuntimeError("the compact backend needs msgpack - pip install msgpack")
+    results['save'] = timed(lambda: backend.save(data), repeat=3)
+    results['parse'] = timed(backend.load, repeat=3)
+    results['parse']['memory_mb'] = loaded_memory(backend)
+    results['parse']['file_mb'] = os.path.getsize(backend.data_file if backend_kind != 'sqlite' else app.DB_FILE) / 2**20
+    storage_ids = list(data['storages'])
+    results['load_storage'] = timed_each(backend.load_storage, [(rng.choice(storage_ids),) for _ in range(20)])
+    results['build_stats'] = timed(lambda: app.build_stats(data), repeat=3)
+    results['get_stats'] = timed(lambda: app.get_stats(data), repeat=100)
+
+    # Mutations go through commit_change - the path auto_save and safe_delete_item take
+    results['store_load'] = timed(app.get_inventory)
+    results['store_refresh'] = timed(app.get_inventory, repeat=100)  # every rerun, nothing changed
+    data = app.get_inventory_store()['data']
+    # The ledger is seeded with every item when first opened, ahead of any commit
+    results['history_seed'] = timed(lambda: app.get_ledger(app.lab))
+    updates = []
+    for _ in range(MUTATIONS):
+        storage_id, item = random_item(rng, data)
+        status = rng.choice([s for s in data['status_options'] if s != item['status']])
+        updates.append((storage_id, item['id'], status))
+    results['update_item'] = timed_each(
+        lambda storage_id, item_id, status: app.commit_change(
+            'update_item', storage_id=storage_id, item_id=item_id, changes={'status': status}), updates)
+    adds = [(rng.choice(storage_ids), make_item(rng, data, item_count + n + 1)) for n in range(MUTATIONS)]
+    results['add_item'] = timed_each(
+        lambda storage_id, item: app.commit_change('add_item', storage_id=storage_id, item=item), adds)
+    deletes = []
+    for _ in range(MUTATIONS):
+        storage_id, item = random_item(rng, data)
+        if (storage_id, item['id']) not in deletes:
+            deletes.append((storage_id, item['id']))
+    results['delete_item'] = timed_each(
+        lambda storage_id, item_id: app.commit_change('remove_item', storage_id=storage_id, item_id=item_id), deletes)
+    if storage_count > 1:
+        moves = []
+        for _ in range(MUTATIONS):
+            storage_id, item = random_item(rng, data)
+            if item['id'] not in {move[1] for move in moves}:
+                moves.append((storage_id, item['id'], rng.choice([s for s in storage_ids if s != storage_id])))
+        results['move_item'] = timed_each(
+            lambda storage_id, item_id, to_storage_id: app.commit_change(
+                'move_item', storage_id=storage_id, item_id=item_id, to_storage_id=to_storage_id), moves)
+
+    words = [rng.choice(ITEM_NAMES).split()[0].lower()[:4] for _ in range(20)]
+    results['search'] = timed_each(app.search_items, [(word,) for word in words])
+    index = app.InventoryIndex()
+    results['search_index_build'] = timed(lambda: index.build(data))
+    return results
+
+def dashboard_case(backend_kind, item_count, storage_count):
+    """Headless dashboard_view and storage scan runs through Streamlit's AppTest"""
+    from streamlit.testing.v1 import AppTest
+    app = load_app(backend_kind)
+    app.get_backend().save(make_inventory(app, item_count, storage_count))
+
+    def run(at):
+        at.run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+
+    results = {}
+    dashboard = AppTest.from_file(APP_FILE, default_timeout=600)
+    results['dashboard_cold'] = timed(lambda: run(dashboard))  # includes the server's first full load
+    results['dashboard_rerun'] = timed(lambda: run(dashboard), repeat=5)
+    scans = []
+    for number in range(1, 6):
+        scan = AppTest.from_file(APP_FILE, default_timeout=600)
+        scan.query_params.update(view='storage', id=f'storage_{(number * 7919) % storage_count + 1}')
+        scans.append((scan,))
+    results['storage_scan'] = timed_each(run, scans)
+    return results
+
+def qr_case():
+    """QR codes rendered cold, served from the memory and disk caches, and rendered as a batch"""
+    app = load_app('json')
+    payloads = [app.get_storage_qr_url(f'storage_{n}') for n in range(QR_CODES)]
+    results = {}
+    results['qr_render'] = timed_each(app.generate_qr_code, [(p,) for p in payloads])
+    results['qr_cold'] = timed_each(app.get_qr_image, [(p,) for p in payloads])  # render + cache write
+    results['qr_memory_hit'] = timed_each(app.get_qr_image, [(p,) for p in payloads])
+    app.get_qr_cache()['images'].clear()
+    results['qr_disk_hit'] = timed_each(app.get_qr_image, [(p,) for p in payloads])
+    # Pool start-up - spawning the workers and importing qr_labels in each - is a once-per-server cost,
+    # so a throwaway batch pays it before the timing starts
+    app.generate_qr_batch([app.get_storage_qr_url(f'warm_{n}') for n in range(QR_CODES)])
+    batch = [app.get_storage_qr_url(f'batch_{n}') for n in range(QR_CODES * 5)]
+    results['qr_batch_per_code'] = {
+        key: value / len(batch) if key != 'runs' else len(batch)
+        for key, value in timed(lambda: app.generate_qr_batch(batch)).items()}
+    app.get_qr_pool().shutdown()
+    return results
+
+def stress_worker(backend_kind, workdir, worker):
+    os.chdir(workdir)
+    app = load_app(backend_kind)
+    app.JOURNAL_COMPACT_THRESHOLD = 25  # compactions race with the writers too
+    for n in range(STRESS_ADDS):
+        app.commit_change('add_item', storage_id='storage_1', item={
+            'id': f'stress_{worker}_{n}', 'name': f'Stress {worker}-{n}', 'count': 1, 'unit': 'units',
+            'min_stock': 0, 'status': 'Available', 'category': 'Tools'})
+
+def stress_case(backend_kind):
+    """Concurrent item adds from several processes - every add must survive"""
+    app = load_app(backend_kind)
+    before = len(app.get_backend().load()[0]['storages']['storage_1']['items'])
+    ctx = mp.get_context('spawn')
+    workers = [ctx.Process(target=stress_worker, args=(backend_kind, os.getcwd(), n))
+               for n in range(STRESS_PROCESSES)]
+    start = time.perf_counter()
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    elapsed = time.perf_counter() - start
+    items = app.get_backend().load()[0]['storages']['storage_1']['items']
+    expected = STRESS_PROCESSES * STRESS_ADDS
+    saved = len({item['id'] for item in items}) - before
+    if saved != expected or any(process.exitcode for process in workers):
+        raise RuntimeError(f"lost updates: {saved} of {expected} concurrent adds saved, "
+                           f"worker exit codes {[process.exitcode for process in workers]}")
+    return {'concurrent_adds': {'min': elapsed, 'median': elapsed, 'max': elapsed, 'runs': 1,
+                                'adds_per_second': expected / elapsed, 'lost': expected - saved}}
+
+# RUNNER
+def case_process(results, scenario, args):
+    workdir = tempfile.mkdtemp(prefix='inventory-benchmark-')
+    os.chdir(workdir)
+    try:
+        results.put(scenario(*args))
+    except Exception as e:
+        results.put({'error': f"{type(e).__name__}: {e}"})
+    finally:
+        os.chdir(APP_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def run_isolated(scenario, *args):
+    """{name: timings} from a scenario run in a fresh process - {'error': ...} if it failed"""
+    ctx = mp.get_context('spawn')
+    results = ctx.Queue()
+    process = ctx.Process(target=case_process, args=(results, scenario, args))
+    process.start()
+    while True:
+        try:
+            outcome = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if not process.is_alive():
+                outcome = {'error': f"benchmark process exited with code {process.exitcode}"}
+                break
+    process.join()
+    return outcome
+
+def get_environment():
+    try:
+        revision = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=APP_DIR,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    import streamlit
+    return {'revision': revision, 'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'cpu_count': os.cpu_count(), 'streamlit': streamlit.__version__}
+
+def parse_sizes(text):
+    sizes = []
+    for size in text.split(','):
+        items, _, storages = size.partition('x')
+        sizes.append((int(items), int(storages or 1)))
+    return sizes
+
+def result_key(row):
+    return (row['backend'], row['items'], row['storages'], row['scenario'])
+
+def format_seconds(seconds):
+    return f"{seconds * 1000:10.2f} ms" if seconds < 1 else f"{seconds:10.2f} s "
+
+def record(rows, backend_kind, item_count, storage_count, outcome):
+    label = f"{backend_kind or '-'} {item_count}x{storage_count}" if item_count else backend_kind or '-'
+    if 'error' in outcome:
+        print(f"{label:<22} FAILED: {outcome['error']}")
+        rows.append({'backend': backend_kind, 'items': item_count, 'storages': storage_count,
+                     'scenario': None, 'error': outcome['error']})
+        return
+    for scenario, timings in outcome.items():
+        rows.append({'backend': backend_kind, 'items': item_count, 'storages': storage_count,
+                     'scenario': scenario, **timings})
+        extra = ''.join(f", {key} {value:.1f}" for key, value in timings.items()
+                        if key not in ('min', 'median', 'max', 'runs'))
+        print(f"{label:<22} {scenario:<20} {format_seconds(timings['median'])}  (min {timings['min']:.4f} s, "
+              f"{timings['runs']} runs{extra})")
+
+def compare(rows, old_file):
+    """Median change per scenario against an earlier results file"""
+    with open(old_file, encoding='utf-8') as f:
+        old = json.load(f)
+    old_rows = {result_key(row): row for row in old['results'] if 'median' in row}
+    print(f"\nCompared with {old.get('revision')} ({old.get('timestamp')}):")
+    slower = 0
+    for row in rows:
+        previous = old_rows.get(result_key(row))
+        if previous is None or 'median' not in row or not previous['median']:
+            continue
+        ratio = row['median'] / previous['median']
+        flag = '  SLOWER' if ratio > SLOWER_RATIO and row['median'] > COMPARE_FLOOR else ''
+        slower += bool(flag)
+        label = f"{row['backend'] or '-'} {row['items']}x{row['storages']}" if row['items'] else row['backend'] or '-'
+        print(f"{label:<22} {row['scenario']:<20} {format_seconds(previous['median'])} -> "
+              f"{format_seconds(row['median'])}  x{ratio:.2f}{flag}")
+    return slower
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the inventory data paths on synthetic inventories")
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help="comma-separated ITEMSxSTORAGES, e.g. 1000x50")
+    parser.add_argument('--backends', default='json,compact,sqlite', help="comma-separated: json, compact, sqlite")
+    parser.add_argument('--skip', default='', help="comma-separated: data, dashboard, qr, stress")
+    parser.add_argument('--output', default='benchmark_results.json', help="results file to write")
+    parser.add_argument('--compare', help="earlier results file to compare medians against")
+    args = parser.parse_args()
+    skip = set(filter(None, args.skip.split(',')))
+    backends = [kind for kind in args.backends.split(',') if kind]
+
+    rows = []
+    for backend_kind in backends:
+        for item_count, storage_count in parse_sizes(args.sizes):
+            if 'data' not in skip:
+                record(rows, backend_kind, item_count, storage_count,
+                       run_isolated(data_paths_case, backend_kind, item_count, storage_count))
+            if 'dashboard' not in skip:
+                record(rows, backend_kind, item_count, storage_count,
+                       run_isolated(dashboard_case, backend_kind, item_count, storage_count))
+        if 'stress' not in skip:
+            record(rows, backend_kind, None, None, run_isolated(stress_case, backend_kind))
+    if 'qr' not in skip:
+        record(rows, None, None, None, run_isolated(qr_case))
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({**get_environment(), 'results': rows}, f, indent=2)
+    print(f"\nResults written to {args.output}")
+    failed = sum('error' in row for row in rows)
+    slower = compare(rows, args.compare) if args.compare else 0
+    return 1 if failed or slower else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
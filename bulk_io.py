@@ -0,0 +1,74 @@
+# bulk_io.py - streaming CSV/XLSX reading and writing for bulk item import and export
+# Rows are handled one at a time, never as a whole-sheet table.
+import csv
+import io
+
+try:
+    import openpyxl
+except ImportError:  # XLSX disabled - CSV import and export still work
+    openpyxl = None
+
+EXPORT_COLUMNS = ['storage_id', 'storage', 'location', 'type', 'item_id', 'name',
+                  'count', 'unit', 'min_stock', 'category', 'status']
+# Header spellings accepted on import -> column name
+COLUMN_ALIASES = {
+    'item': 'name', 'item name': 'name', 'item_name': 'name',
+    'quantity': 'count', 'qty': 'count',
+    'storage name': 'storage', 'storage_name': 'storage', 'storage id': 'storage_id',
+    'storage type': 'type', 'storage_type': 'type',
+    'reorder below': 'min_stock', 'min stock': 'min_stock', 'reorder': 'min_stock',
+}
+
+def supported_formats():
+    return ['csv', 'xlsx'] if openpyxl is not None else ['csv']
+
+def normalize_column(header):
+    name = str(header or '').strip().lower()
+    return COLUMN_ALIASES.get(name, name.replace(' ', '_'))
+
+def iter_rows(file, fmt='csv'):
+    """(row number, {column: text}) for each non-empty row of a binary CSV/XLSX file"""
+    if fmt == 'xlsx':
+        if openpyxl is None:
+            raise ValueError("XLSX support needs openpyxl - pip install openpyxl")
+        # read_only streams the sheet XML instead of building every cell object up front
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+    else:
+        rows = csv.reader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+    try:
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [normalize_column(name) for name in header]
+        for number, values in enumerate(rows, start=2):
+            row = {column: '' if value is None else str(value).strip()
+                   for column, value in zip(columns, values) if column}
+            if any(row.values()):
+                yield number, row
+    finally:
+        if fmt == 'xlsx':
+            workbook.close()
+
+def write_csv(rows):
+    """CSV bytes for export rows - written row by row"""
+    buf = io.BytesIO()
+    text = io.TextIOWrapper(buf, encoding='utf-8-sig', newline='', write_through=True)
+    writer = csv.writer(text)
+    writer.writerow(EXPORT_COLUMNS)
+    writer.writerows(rows)
+    text.detach()
+    return buf.getvalue()
+
+def write_xlsx(rows):
+    """XLSX bytes for export rows - a write-only workbook streams rows instead of keeping cells"""
+    if openpyxl is None:
+        raise ValueError("XLSX support needs openpyxl - pip install openpyxl")
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Inventory')
+    sheet.append(EXPORT_COLUMNS)
+    for row in rows:
+        sheet.append(row)
+    buf = io.BytesIO()
+    workbook.save(buf)
+    return buf.getvalue()
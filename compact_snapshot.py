@@ -0,0 +1,116 @@
+# compact_snapshot.py - msgpack inventory snapshots with interned enums, decodable one storage at a time
+# Layout: magic, header length, msgpack header (journal seq, enum tables, byte ranges), then the other
+# inventory fields (counters, settings) and one msgpack blob per storage.
+# Items are rows, not dicts - category, status and unit are indexes into the enum tables, so every
+# item shares one string object per value.
+import struct
+
+try:
+    import msgpack
+except ImportError:  # compact snapshots disabled - the JSON snapshot still works
+    msgpack = None
+
+MAGIC = b'INVSNAP1'
+HEADER_LENGTH = struct.Struct('<I')
+ITEM_FIELDS = ('id', 'name', 'count', 'unit', 'min_stock', 'status', 'category')
+ENUMS = ('category', 'status', 'unit', 'type')
+ABSENT = -1  # enum index of a storage without a type
+
+def available():
+    return msgpack is not None
+
+def pack(value):
+    return msgpack.packb(value, use_bin_type=True)
+
+def unpack(raw):
+    return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+
+def encode(data):
+    """Snapshot bytes for an inventory dict"""
+    if msgpack is None:
+        raise ValueError("Compact snapshots need msgpack - pip install msgpack")
+    tables = {name: [] for name in ENUMS}
+    positions = {name: {} for name in ENUMS}
+
+    def intern(name, value):
+        index = positions[name].get(value)
+        if index is None:
+            index = positions[name][value] = len(tables[name])
+            tables[name].append(value)
+        return index
+
+    fields_blob = pack({k: v for k, v in data.items() if k != 'storages'})
+    blobs, ranges, offset = [fields_blob], [], len(fields_blob)
+    for storage_id, storage in data['storages'].items():
+        fields = {k: v for k, v in storage.items() if k not in ('items', 'type')}
+        rows = []
+        for item in storage['items']:
+            if not all(field in item for field in ITEM_FIELDS):
+                rows.append(item)  # incomplete legacy item - kept as it is
+                continue
+            extra = {k: v for k, v in item.items() if k not in ITEM_FIELDS} or None
+            rows.append([item['id'], item['name'], item['count'], intern('unit', item['unit']), item['min_stock'],
+                         intern('status', item['status']), intern('category', item['category']), extra])
+        storage_type = intern('type', storage['type']) if 'type' in storage else ABSENT
+        blob = pack([fields, storage_type, rows])
+        blobs.append(blob)
+        ranges.append([storage_id, offset, len(blob)])
+        offset += len(blob)
+    header = pack({'journal_seq': data.get('journal_seq', 0), 'enums': tables,
+                   'fields': [0, len(fields_blob)], 'storages': ranges})
+    return b''.join([MAGIC, HEADER_LENGTH.pack(len(header)), header] + blobs)
+
+def decode_storage(raw, enums):
+    fields, storage_type, rows = unpack(raw)
+    storage = fields
+    if storage_type != ABSENT:
+        storage['type'] = enums['type'][storage_type]
+    units, statuses, categories = enums['unit'], enums['status'], enums['category']
+    items = []
+    for row in rows:
+        if type(row) is dict:
+            items.append(row)
+            continue
+        item_id, name, count, unit, min_stock, status, category, extra = row
+        item = {'id': item_id, 'name': name, 'count': count, 'unit': units[unit], 'min_stock': min_stock,
+                'status': statuses[status], 'category': categories[category]}
+        if extra:
+            item.update(extra)
+        items.append(item)
+    storage['items'] = items
+    return storage
+
+def read_header(f):
+    """(header, offset of the first storage blob) from an open snapshot file"""
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not a compact inventory snapshot")
+    (length,) = HEADER_LENGTH.unpack(f.read(HEADER_LENGTH.size))
+    return unpack(f.read(length)), len(MAGIC) + HEADER_LENGTH.size + length
+
+def decode(raw):
+    """The whole inventory dict from snapshot bytes"""
+    if raw[:len(MAGIC)] != MAGIC:
+        raise ValueError("not a compact inventory snapshot")
+    (length,) = HEADER_LENGTH.unpack_from(raw, len(MAGIC))
+    start = len(MAGIC) + HEADER_LENGTH.size
+    header = unpack(raw[start:start + length])
+    body = memoryview(raw)[start + length:]
+    offset, size = header['fields']
+    data = unpack(body[offset:offset + size])
+    data['storages'] = {storage_id: decode_storage(body[offset:offset + size], header['enums'])
+                        for storage_id, offset, size in header['storages']}
+    return data
+
+def read(path):
+    with open(path, 'rb') as f:
+        return decode(f.read())
+
+def read_storage(path, storage_id):
+    """(journal seq, storage or None) - reads the header and that storage's bytes only"""
+    with open(path, 'rb') as f:
+        header, body_start = read_header(f)
+        for candidate, offset, size in header['storages']:
+            if candidate == storage_id:
+                f.seek(body_start + offset)
+                return header['journal_seq'], decode_storage(f.read(size), header['enums'])
+    return header['journal_seq'], None
@@ -0,0 +1,129 @@
+# diagnostics.py - timing spans and counters for the app's hot paths, exported as JSON or Prometheus text
+# While collection is off, span() hands back one shared no-op context and count() returns on its
+# first check, so instrumented code pays close to nothing.
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+
+from storage_io import write_atomic
+
+SAMPLES_KEPT = 1000  # most recent durations per span, for percentiles
+QUANTILES = (0.5, 0.9, 0.99)
+NO_SPAN = nullcontext()
+logger = logging.getLogger(__name__)
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+def label_value(value):
+    """A Prometheus label value with backslashes, quotes and newlines escaped"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Span:
+    def __init__(self, diagnostics, name):
+        self.diagnostics = diagnostics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.diagnostics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+class Diagnostics:
+    """Process-wide durations per span name and event counters"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.samples = {}   # span -> recent durations
+            self.totals = {}    # span -> [calls, seconds, slowest]
+            self.counters = {}
+            self.since = time.time()
+
+    def span(self, name):
+        """Context manager timing a block under name"""
+        if not self.enabled:
+            return NO_SPAN
+        return Span(self, name)
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            samples = self.samples.get(name)
+            if samples is None:
+                samples = self.samples[name] = deque(maxlen=SAMPLES_KEPT)
+                self.totals[name] = [0, 0.0, 0.0]
+            samples.append(seconds)
+            totals = self.totals[name]
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] = max(totals[2], seconds)
+
+    def count(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def snapshot(self):
+        """{'since', 'enabled', 'spans': {name: calls, seconds, max, p50, p90, p99}, 'counters'} -
+        spans ordered by total time, the top costs first"""
+        with self.lock:
+            samples = {name: sorted(values) for name, values in self.samples.items()}
+            totals = {name: list(values) for name, values in self.totals.items()}
+            counters = dict(self.counters)
+        spans = {}
+        for name in sorted(totals, key=lambda name: -totals[name][1]):
+            calls, seconds, slowest = totals[name]
+            spans[name] = {'calls': calls, 'seconds': seconds, 'max': slowest,
+                           **{f'p{round(q * 100)}': percentile(samples[name], q) for q in QUANTILES}}
+        return {'since': self.since, 'enabled': self.enabled, 'spans': spans, 'counters': counters}
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix='inventory'):
+        """Prometheus text exposition - a summary per span, a counter per event"""
+        snapshot = self.snapshot()
+        lines = [f'# HELP {prefix}_span_seconds Time spent in instrumented code paths',
+                 f'# TYPE {prefix}_span_seconds summary']
+        for name, span in snapshot['spans'].items():
+            name = label_value(name)
+            for q in QUANTILES:
+                lines.append(f'{prefix}_span_seconds{{span="{name}",quantile="{q}"}} '
+                             f'{span[f"p{round(q * 100)}"]:.6f}')
+            lines.append(f'{prefix}_span_seconds_sum{{span="{name}"}} {span["seconds"]:.6f}')
+            lines.append(f'{prefix}_span_seconds_count{{span="{name}"}} {span["calls"]}')
+        lines += [f'# HELP {prefix}_events_total Cache hits and misses, reloads and bytes written',
+                  f'# TYPE {prefix}_events_total counter']
+        for name, value in sorted(snapshot['counters'].items()):
+            lines.append(f'{prefix}_events_total{{event="{label_value(name)}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write_export(self, path):
+        """Replace path with the current data - JSON for *.json, Prometheus text otherwise"""
+        payload = self.to_json() if path.endswith('.json') else self.to_prometheus()
+        write_atomic(path, payload.encode('utf-8'))
+
+    def start_export(self, path, interval):
+        """Rewrite path every interval seconds on a daemon thread - e.g. for node_exporter's textfile
+        collector, or any local agent that reads a file"""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.write_export(path)
+                except OSError:
+                    logger.exception("Diagnostics export error")
+        threading.Thread(target=run, daemon=True, name='diagnostics-export').start()
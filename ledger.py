@@ -0,0 +1,180 @@
+# ledger.py - append-only history of item status changes and moves, kept in SQLite
+# Every transition is one event row; the time an item spends in each status is also kept as periods,
+# so reports read the requested time range instead of replaying the whole history.
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from storage_io import connect_sqlite
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS events (
+        id INTEGER PRIMARY KEY,
+        ts INTEGER NOT NULL,          -- unix seconds
+        item_id TEXT NOT NULL,
+        kind TEXT NOT NULL,           -- 'status' (None = created/removed) or 'move'
+        old_value TEXT,
+        new_value TEXT,
+        storage_id TEXT,
+        user TEXT,
+        seq INTEGER                   -- journal sequence number of the change
+    );
+    CREATE INDEX IF NOT EXISTS idx_events_ts ON events(ts);
+    CREATE INDEX IF NOT EXISTS idx_events_item ON events(item_id, ts);
+    CREATE TABLE IF NOT EXISTS periods (
+        id INTEGER PRIMARY KEY,
+        item_id TEXT NOT NULL,
+        status TEXT NOT NULL,
+        storage_id TEXT,
+        user TEXT,
+        start_ts INTEGER NOT NULL,
+        end_ts INTEGER,               -- NULL while the item is still in this status
+        start_seq INTEGER             -- journal sequence number of the change that started it
+    );
+    CREATE INDEX IF NOT EXISTS idx_periods_item ON periods(item_id, start_ts);
+    CREATE INDEX IF NOT EXISTS idx_periods_end ON periods(end_ts);
+    CREATE INDEX IF NOT EXISTS idx_periods_open ON periods(item_id) WHERE end_ts IS NULL;
+    CREATE TABLE IF NOT EXISTS items (
+        item_id TEXT PRIMARY KEY,
+        name TEXT,
+        category TEXT
+    );
+"""
+
+class Ledger:
+    """Event ledger plus the status periods derived from it"""
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.local = threading.local()
+        self.connect().executescript(SCHEMA)
+        self.add_column('events', 'seq INTEGER')
+        self.add_column('periods', 'start_seq INTEGER')
+        self.seeded = self.connect().execute("SELECT EXISTS (SELECT 1 FROM events)").fetchone()[0]
+
+    def connect(self):
+        """One connection per thread - Streamlit serves sessions on separate threads"""
+        return connect_sqlite(self.db_file, self.local)
+
+    def add_column(self, table, column):
+        """Upgrade a ledger written before the column existed"""
+        conn = self.connect()
+        if column.split()[0] not in [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]:
+            try:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+            except sqlite3.OperationalError:
+                pass  # another process added it first
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def seed(self, events, seq=None):
+        """Starting state for items that predate the ledger, as of journal sequence number seq - once,
+        whichever process gets here first"""
+        with self.transaction() as conn:
+            if conn.execute("SELECT NOT EXISTS (SELECT 1 FROM events)").fetchone()[0]:
+                self.write(conn, events, int(time.time()), seq)
+        self.seeded = True
+
+    def record(self, events, ts=None, seq=None):
+        """Append events in one transaction and move the items' status periods along. Event dicts:
+        item_id, name, category, kind, old, new, storage_id, user, and status - what the item is
+        in afterwards, None once it was removed. seq is the journal sequence number of the change -
+        writers record after releasing the inventory lock, so changes can arrive out of order"""
+        if not events:
+            return
+        with self.transaction() as conn:
+            self.write(conn, events, int(ts if ts is not None else time.time()), seq)
+
+    def write(self, conn, events, ts, seq=None):
+        conn.executemany("INSERT INTO events (ts, item_id, kind, old_value, new_value, storage_id, user, seq) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                         [(ts, e['item_id'], e['kind'], e.get('old'), e.get('new'), e.get('storage_id'),
+                           e.get('user'), seq) for e in events])
+        conn.executemany("INSERT INTO items VALUES (?, ?, ?) ON CONFLICT(item_id) DO UPDATE SET "
+                         "name = excluded.name, category = excluded.category",
+                         [(e['item_id'], e.get('name'), e.get('category')) for e in events])
+        for e in events:
+            later = None
+            if seq is not None:
+                later = conn.execute("SELECT start_ts FROM periods WHERE item_id = ? AND start_seq > ? "
+                                     "ORDER BY start_seq, id LIMIT 1", (e['item_id'], seq)).fetchone()
+            if later is None:
+                conn.execute("UPDATE periods SET end_ts = ? WHERE item_id = ? AND end_ts IS NULL",
+                             (ts, e['item_id']))
+                end_ts = None
+            else:
+                # A later change to this item was recorded first - fit this one in before it
+                end_ts = later[0]
+                conn.execute("UPDATE periods SET end_ts = ? WHERE id = ("
+                             "SELECT id FROM periods WHERE item_id = ? AND COALESCE(start_seq, 0) <= ? "
+                             "ORDER BY COALESCE(start_seq, 0) DESC, id DESC LIMIT 1)",
+                             (min(ts, end_ts), e['item_id'], seq))
+            if e.get('status') is not None:
+                conn.execute("INSERT INTO periods (item_id, status, storage_id, user, start_ts, end_ts, start_seq) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                             (e['item_id'], e['status'], e.get('storage_id'), e.get('user'),
+                              ts if end_ts is None else min(ts, end_ts), end_ts, seq))
+
+    def describe(self, item_id, name, category):
+        """Keep an item's name and category current for reports - no event"""
+        self.connect().execute("UPDATE items SET name = ?, category = ? WHERE item_id = ?",
+                               (name, category, item_id))
+
+    def history(self, start, end, item_id=None, limit=500):
+        """Events in [start, end), newest first - a range scan on the time (or item + time) index"""
+        query = ("SELECT e.ts, e.item_id, i.name, e.kind, e.old_value, e.new_value, e.storage_id, e.user "
+                 "FROM events e LEFT JOIN items i USING (item_id) WHERE e.ts >= ? AND e.ts < ?")
+        params = [start, end]
+        if item_id is not None:
+            query += " AND e.item_id = ?"
+            params.append(item_id)
+        query += " ORDER BY e.ts DESC, e.seq DESC, e.id DESC LIMIT ?"
+        params.append(limit)
+        return self.connect().execute(query, params).fetchall()
+
+    def periods(self, start, end, item_id=None, status=None):
+        """Status periods overlapping [start, end), clipped to it - (item_id, name, category, status,
+        storage_id, user, start, end). Reads the periods that ended inside the range plus, per item,
+        the one still running at its end, so the cost follows the range and the item count"""
+        columns = "p.item_id, i.name, i.category, p.status, p.storage_id, p.user, p.start_ts, p.end_ts"
+        filters, params = "", []
+        if item_id is not None:
+            filters += " AND i.item_id = ?"
+            params.append(item_id)
+        if status is not None:
+            filters += " AND p.status = ?"
+            params.append(status)
+        conn = self.connect()
+        ended = conn.execute(
+            f"SELECT {columns} FROM periods p LEFT JOIN items i USING (item_id) "
+            f"WHERE p.end_ts > ? AND p.end_ts <= ?{filters}",
+            [start, end] + params).fetchall()
+        # Latest period started before the range end, per item - one index probe each
+        running = conn.execute(
+            f"SELECT {columns} FROM items i JOIN periods p ON p.id = ("
+            f"SELECT id FROM periods WHERE item_id = i.item_id AND start_ts < ? "
+            f"ORDER BY start_ts DESC, id DESC LIMIT 1) "
+            f"WHERE (p.end_ts IS NULL OR p.end_ts > ?){filters}",
+            [end, end] + params).fetchall()
+        return [row[:6] + (max(row[6], start), min(row[7] or end, end)) for row in ended + running]
+
+    def utilization(self, start, end, category=None):
+        """Time spent per (category, status) in [start, end): {(category, status): (seconds, periods, items)}"""
+        report = {}
+        for item_id, _, item_category, status, _, _, period_start, period_end in self.periods(start, end):
+            if category is not None and item_category != category:
+                continue
+            seconds, count, items = report.get((item_category, status), (0, 0, set()))
+            items.add(item_id)
+            report[(item_category, status)] = (seconds + period_end - period_start, count + 1, items)
+        return {key: (seconds, count, len(items)) for key, (seconds, count, items) in report.items()}
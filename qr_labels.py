@@ -0,0 +1,100 @@
+# qr_labels.py - QR rendering that runs in worker processes, plus printable label sheets
+# Kept free of Streamlit so process-pool workers can import it cheaply.
+import io
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import qrcode
+from PIL import Image, ImageDraw, ImageFont
+
+# Label sheet layout - A4 portrait at 150 DPI
+PAGE_SIZE = (1240, 1754)
+PAGE_MARGIN = 60
+LABEL_COLUMNS = 3
+LABEL_ROWS = 4
+LABEL_QR_SIZE = 300
+
+def render_qr_png(data, params):
+    """Render one QR code to PNG bytes"""
+    qr = qrcode.QRCode(
+        version=params['version'],
+        error_correction=getattr(qrcode.constants, f"ERROR_CORRECT_{params['error_correction']}"),
+        box_size=params['box_size'],
+        border=params['border'],
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    qr_img = qr.make_image(fill_color="black", back_color="white")
+    buf = io.BytesIO()
+    qr_img.save(buf, format="PNG")
+    return buf.getvalue()
+
+def render_qr_chunk(payloads, params):
+    """Worker entry point - one pickled round trip per chunk, not per code"""
+    return [render_qr_png(data, params) for data in payloads]
+
+def create_qr_pool(workers=None):
+    """Process pool for QR rendering - spawned so workers never inherit app threads"""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+def render_qr_batch(pool, workers, payloads, params):
+    """Render many QR codes across the pool, preserving input order"""
+    if not payloads:
+        return []
+    chunk_size = max(1, len(payloads) // (workers * 4))
+    chunks = [payloads[i:i + chunk_size] for i in range(0, len(payloads), chunk_size)]
+    futures = [pool.submit(render_qr_chunk, chunk, params) for chunk in chunks]
+    images = []
+    for future in futures:
+        images.extend(future.result())
+    return images
+
+def load_font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 has a single fixed-size bitmap font
+        return ImageFont.load_default()
+
+def render_label_pages(labels):
+    """Tile (png, title, caption) labels onto A4 pages"""
+    per_page = LABEL_COLUMNS * LABEL_ROWS
+    cell_width = (PAGE_SIZE[0] - 2 * PAGE_MARGIN) // LABEL_COLUMNS
+    cell_height = (PAGE_SIZE[1] - 2 * PAGE_MARGIN) // LABEL_ROWS
+    title_font = load_font(28)
+    caption_font = load_font(22)
+    pages = []
+    for start in range(0, len(labels), per_page):
+        page = Image.new('RGB', PAGE_SIZE, 'white')
+        draw = ImageDraw.Draw(page)
+        for slot, (png, title, caption) in enumerate(labels[start:start + per_page]):
+            left = PAGE_MARGIN + (slot % LABEL_COLUMNS) * cell_width
+            top = PAGE_MARGIN + (slot // LABEL_COLUMNS) * cell_height
+            draw.rectangle([left + 4, top + 4, left + cell_width - 4, top + cell_height - 4], outline='#bbbbbb')
+            qr_img = Image.open(io.BytesIO(png)).convert('RGB').resize((LABEL_QR_SIZE, LABEL_QR_SIZE))
+            page.paste(qr_img, (left + (cell_width - LABEL_QR_SIZE) // 2, top + 16))
+            text_top = top + 16 + LABEL_QR_SIZE + 8
+            for text, font in ((title, title_font), (caption, caption_font)):
+                width = draw.textlength(text, font=font)
+                while width > cell_width - 24 and len(text) > 1:
+                    text = text[:-2] + '…'
+                    width = draw.textlength(text, font=font)
+                draw.text((left + (cell_width - width) / 2, text_top), text, fill='black', font=font)
+                text_top += 36
+        pages.append(page)
+    return pages
+
+def build_label_sheet(labels, fmt='pdf'):
+    """Printable label sheet - multi-page PDF, or a ZIP of tiled PNG pages"""
+    pages = render_label_pages(labels)
+    buf = io.BytesIO()
+    if fmt == 'pdf':
+        pages[0].save(buf, format='PDF', save_all=True, append_images=pages[1:], resolution=150)
+    else:
+        with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for number, page in enumerate(pages, start=1):
+                page_buf = io.BytesIO()
+                page.save(page_buf, format='PNG')
+                archive.writestr(f"labels_page_{number}.png", page_buf.getvalue())
+    return buf.getvalue()
@@ -0,0 +1,152 @@
+# search_index.py - in-memory inverted index over inventory items
+# The app holds one index per process, next to the shared inventory.
+import heapq
+import re
+from bisect import bisect_left, insort
+
+TOKEN_PATTERN = re.compile(r'[0-9a-z]+')
+FUZZY_MIN_LENGTH = 4  # shorter words only match exactly or by prefix
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text or '').lower())
+
+def deletion_variants(token):
+    """The token plus every single-character deletion - two words within one edit share a variant"""
+    return {token} | {token[:i] + token[i + 1:] for i in range(len(token))}
+
+class InventoryIndex:
+    """Item name, category, status, storage name and location -> item ids, updated per delta"""
+
+    def __init__(self):
+        self.postings = {}       # token -> item ids
+        self.vocabulary = []     # sorted tokens, for prefix lookups
+        self.variants = {}       # deletion variant -> tokens, for fuzzy lookups
+        self.item_tokens = {}    # item id -> tokens it was indexed under
+        self.item_storage = {}   # item id -> storage id
+        self.storage_items = {}  # storage id -> item ids
+        self.facets = {'category': {}, 'status': {}}  # facet -> value -> item ids
+        self.item_facets = {}    # item id -> {facet: value}
+        self.item_names = {}     # item id -> lowercased name, for ordering results
+
+    def build(self, data):
+        """Index a freshly loaded inventory"""
+        self.__init__()
+        for storage_id, storage in data['storages'].items():
+            self.storage_items[storage_id] = set()
+            for item in storage['items']:
+                self.add_item(storage, item)
+
+    def apply(self, data, entry, items):
+        """Follow one delta record - call after apply_change has updated data and the item index"""
+        op = entry['op']
+        if op == 'add_storage':
+            storage = data['storages'][entry['storage']['id']]
+            self.storage_items[storage['id']] = set()
+            for item in storage['items']:
+                self.add_item(storage, item)
+        elif op == 'update_storage':
+            storage = data['storages'].get(entry['storage_id'])
+            if storage is not None:
+                for item in storage['items']:
+                    self.remove_item(item['id'])
+                    self.add_item(storage, item)
+        elif op == 'delete_storage':
+            for item_id in list(self.storage_items.pop(entry['storage_id'], ())):
+                self.remove_item(item_id)
+        elif op == 'import_items':
+            for storage in entry['storages']:
+                self.storage_items.setdefault(storage['id'], set())
+            for storage_id, item in entry['items']:
+                storage = data['storages'].get(storage_id)
+                if storage is not None:
+                    self.add_item(storage, item)
+        elif op in ('add_item', 'update_item', 'remove_item', 'move_item'):
+            if op == 'add_item':
+                storage = data['storages'].get(entry['storage_id'])
+                if storage is not None:
+                    self.add_item(storage, entry['item'])
+            else:
+                # Re-indexed wherever the item is now - storage name and location are indexed too
+                self.remove_item(entry['item_id'])
+                storage_id, item = items.locate(entry['item_id'])
+                if item is not None:
+                    self.add_item(data['storages'][storage_id], item)
+
+    def add_item(self, storage, item):
+        item_id = item['id']
+        tokens = set()
+        for text in (item.get('name'), item.get('category'), item.get('status'),
+                     storage.get('name'), storage.get('location')):
+            tokens.update(tokenize(text))
+        for token in tokens:
+            ids = self.postings.get(token)
+            if ids is None:
+                ids = self.postings[token] = set()
+                insort(self.vocabulary, token)
+                for variant in deletion_variants(token):
+                    self.variants.setdefault(variant, set()).add(token)
+            ids.add(item_id)
+        self.item_tokens[item_id] = tokens
+        self.item_names[item_id] = str(item.get('name', '')).lower()
+        self.item_storage[item_id] = storage['id']
+        self.storage_items.setdefault(storage['id'], set()).add(item_id)
+        values = {'category': item.get('category', 'Other'), 'status': item.get('status')}
+        for facet, value in values.items():
+            self.facets[facet].setdefault(value, set()).add(item_id)
+        self.item_facets[item_id] = values
+
+    def remove_item(self, item_id):
+        tokens = self.item_tokens.pop(item_id, None)
+        if tokens is None:
+            return
+        for token in tokens:
+            ids = self.postings[token]
+            ids.discard(item_id)
+            if not ids:
+                del self.postings[token]
+                del self.vocabulary[bisect_left(self.vocabulary, token)]
+                for variant in deletion_variants(token):
+                    self.variants[variant].discard(token)
+                    if not self.variants[variant]:
+                        del self.variants[variant]
+        del self.item_names[item_id]
+        storage_id = self.item_storage.pop(item_id)
+        self.storage_items.get(storage_id, set()).discard(item_id)
+        for facet, value in self.item_facets.pop(item_id).items():
+            self.facets[facet][value].discard(item_id)
+            if not self.facets[facet][value]:
+                del self.facets[facet][value]
+
+    def match_word(self, word):
+        """Item ids for one query word - prefix matches, else words within one edit"""
+        ids = set()
+        position = bisect_left(self.vocabulary, word)
+        while position < len(self.vocabulary) and self.vocabulary[position].startswith(word):
+            ids |= self.postings[self.vocabulary[position]]
+            position += 1
+        if not ids and len(word) >= FUZZY_MIN_LENGTH:
+            for variant in deletion_variants(word):
+                for token in self.variants.get(variant, ()):
+                    ids |= self.postings[token]
+        return ids
+
+    def search(self, text='', categories=(), statuses=(), limit=None):
+        """(storage id, item id) pairs matching every word and the facet filters, by item name,
+        and the total number of matches"""
+        result = None
+        for facet, values in (('category', categories), ('status', statuses)):
+            if values:
+                ids = set().union(*(self.facets[facet].get(value, set()) for value in values))
+                result = ids if result is None else result & ids
+        # Rarest words first keeps the intersections small
+        for ids in sorted((self.match_word(word) for word in set(tokenize(text))), key=len):
+            result = ids if result is None else result & ids
+            if not result:
+                break
+        if not result:
+            return [], 0
+        if limit is None:
+            ordered = sorted(result, key=self.item_names.get)
+        else:
+            ordered = heapq.nsmallest(limit, result, key=self.item_names.get)
+        return [(self.item_storage[item_id], item_id) for item_id in ordered], len(result)
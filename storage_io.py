@@ -0,0 +1,51 @@
+# storage_io.py - file and database plumbing shared by the backends, backups, history ledger,
+# diagnostics export and QR cache: atomic file replacement, cross-process lock files and
+# per-thread SQLite connections
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows - locks only hold within one process there
+    fcntl = None
+
+def write_atomic(path, payload):
+    """Write bytes to a temp file, fsync, then os.replace - readers never see a partial file.
+    Returns the number of bytes written"""
+    tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_file, 'wb') as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, path)
+    return len(payload)
+
+@contextmanager
+def file_lock(path, blocking=True):
+    """Exclusive across processes while held - yields False instead of waiting when blocking is off"""
+    with open(path, 'a') as f:
+        if fcntl:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+        try:
+            yield True
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def connect_sqlite(db_file, local):
+    """The calling thread's WAL-mode connection, kept on the threading.local - Streamlit serves
+    sessions on separate threads"""
+    conn = getattr(local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(db_file, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        local.conn = conn
+    return conn
@@ -0,0 +1,39 @@
+# conftest.py - app.py imported the way a server process holds it, inside a scratch directory
+import inspect
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# st.cache_resource doesn't cache outside `streamlit run` - these keep one resource per argument set
+PINNED_RESOURCES = ('get_inventory_store', 'get_backend', 'get_qr_cache', 'get_ledger')
+
+def pin_resource(factory):
+    signature = inspect.signature(factory)
+    resources = {}
+    def get(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = tuple(bound.arguments.items())
+        if key not in resources:
+            resources[key] = factory(*args, **kwargs)
+        return resources[key]
+    return get
+
+def load_app(backend_kind='json'):
+    """A fresh import of app.py with the given storage backend, reading the current directory"""
+    os.environ['INVENTORY_BACKEND'] = backend_kind
+    sys.modules.pop('app', None)
+    import app
+    for name in PINNED_RESOURCES:
+        setattr(app, name, pin_resource(getattr(app, name)))
+    return app
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('INVENTORY_BACKEND', 'json')
+    monkeypatch.delitem(sys.modules, 'app', raising=False)
+    return load_app('json')
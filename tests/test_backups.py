@@ -0,0 +1,81 @@
+# test_backups.py - retention and point-in-time restore over full snapshots and change segments
+import time
+
+from backups import TS_FORMAT, Backups
+
+DAY = 24 * 3600
+NOW = 1_800_000_000
+
+def make_entry(seq, ts, name):
+    return {'op': 'add_item', 'seq': seq, 'ts': time.strftime(TS_FORMAT, time.localtime(ts)), 'name': name}
+
+def apply(data, entry):
+    data['names'].append(entry['name'])
+    data['journal_seq'] = entry['seq']
+
+def test_restore_replays_changes_up_to_the_moment(tmp_path):
+    backups = Backups(str(tmp_path))
+    backups.write_full({'journal_seq': 0, 'names': []}, ts=NOW - 100)
+    backups.write_changes([make_entry(1, NOW - 90, 'a'), make_entry(2, NOW - 80, 'b')])
+    backups.write_changes([make_entry(3, NOW - 70, 'c')])
+
+    assert backups.restore(NOW - 85, apply)['names'] == ['a']
+    assert backups.restore(NOW - 70, apply)['names'] == ['a', 'b', 'c']
+    assert backups.restore(NOW - 200, apply) is None  # older than any full snapshot
+    assert backups.span() == (NOW - 100, NOW - 70)
+
+def test_restore_starts_from_the_newest_full_snapshot_before_it(tmp_path):
+    backups = Backups(str(tmp_path))
+    backups.write_full({'journal_seq': 0, 'names': []}, ts=NOW - 100)
+    backups.write_changes([make_entry(1, NOW - 90, 'a')])
+    backups.write_full({'journal_seq': 1, 'names': ['a (full)']}, ts=NOW - 50)
+    backups.write_changes([make_entry(2, NOW - 40, 'b')])
+
+    assert backups.restore(NOW, apply)['names'] == ['a (full)', 'b']
+    assert backups.archived_seq() == 2
+
+def test_prune_drops_backups_outside_the_window(tmp_path):
+    backups = Backups(str(tmp_path))
+    backups.write_full({'journal_seq': 0, 'names': []}, ts=NOW - 10 * DAY)
+    backups.write_changes([make_entry(1, NOW - 9 * DAY, 'a')])
+    backups.write_full({'journal_seq': 1, 'names': ['a']}, ts=NOW - 8 * DAY)
+    backups.write_full({'journal_seq': 1, 'names': ['a']}, ts=NOW - DAY)
+
+    # The second full snapshot still covers the whole week, so only the first one and its changes go
+    assert backups.prune(keep_seconds=7 * DAY, max_bytes=10 ** 9, now=NOW) == 2
+    fulls, segments = backups.catalog()
+    assert [full['ts'] for full in fulls] == [NOW - 8 * DAY, NOW - DAY] and segments == []
+
+def test_prune_keeps_the_newest_full_snapshot_over_the_size_cap(tmp_path):
+    backups = Backups(str(tmp_path))
+    backups.write_full({'journal_seq': 0, 'names': []}, ts=NOW - 100)
+    backups.write_full({'journal_seq': 0, 'names': []}, ts=NOW - 50)
+    backups.write_changes([make_entry(1, NOW - 40, 'a')])
+
+    assert backups.prune(keep_seconds=DAY, max_bytes=0, now=NOW) == 1
+    fulls, segments = backups.catalog()
+    assert [full['ts'] for full in fulls] == [NOW - 50] and len(segments) == 1
+
+def test_worker_hooks_a_backend_from_an_earlier_run(app, tmp_path):
+    from conftest import load_app
+    # Streamlit re-executes app.py on every run, while the backend comes from st.cache_resource
+    backend = app.get_backend(app.lab)
+    backend.save(backend.load()[0])  # a snapshot up front, so no commit below starts a fold of its own
+    store = app.get_inventory_store(app.lab)
+    app.refresh_inventory(store)
+    rerun = load_app('json')
+    assert type(backend) is not rerun.JsonBackend
+
+    worker = rerun.BackupWorker(Backups(str(tmp_path / 'backups')), store, backend)
+    assert backend.on_fold == worker.keep_folded
+    assert worker.back_up()
+    for number in range(3):
+        assert app.commit_change('add_item', storage_id='storage_1', item={
+            'id': f'item_new_{number}', 'name': f'New {number}', 'count': 1, 'unit': 'units', 'min_stock': 0,
+            'category': 'Tools', 'status': 'Available'})
+    backend.compact()
+
+    # The folded records were kept as a change segment, so every moment in between stays restorable
+    _, segments = worker.backups.catalog()
+    assert worker.backups.archived_seq() == store['data']['journal_seq']
+    assert [(segment['first'], segment['last']) for segment in segments] == [(1, 3)]
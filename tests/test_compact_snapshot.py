@@ -0,0 +1,35 @@
+# test_compact_snapshot.py - msgpack snapshot round trips, whole and one storage at a time
+import pytest
+
+import compact_snapshot
+
+pytestmark = pytest.mark.skipif(not compact_snapshot.available(), reason="needs msgpack")
+
+INVENTORY = {
+    'journal_seq': 42,
+    'categories': ['Drones', 'Tools'],
+    'storages': {
+        'storage_1': {'id': 'storage_1', 'name': 'Cabinet', 'type': 'cabinet', 'items': [
+            {'id': 'item_1', 'name': 'Mavic', 'count': 3, 'unit': 'units', 'min_stock': 1,
+             'status': 'Available', 'category': 'Drones'},
+            {'id': 'item_2', 'name': 'Solder', 'count': 2.5, 'unit': 'm', 'min_stock': 0,
+             'status': 'In Use', 'category': 'Tools', 'note': 'lead-free'},
+            {'id': 'item_3', 'name': 'Legacy', 'quantity': '4 units'},
+        ]},
+        'storage_2': {'id': 'storage_2', 'name': 'Loose shelf', 'items': []},
+    },
+}
+
+def test_round_trip():
+    assert compact_snapshot.decode(compact_snapshot.encode(INVENTORY)) == INVENTORY
+
+def test_read_storage(tmp_path):
+    path = tmp_path / 'inventory.snap'
+    path.write_bytes(compact_snapshot.encode(INVENTORY))
+    assert compact_snapshot.read_storage(str(path), 'storage_1') == (42, INVENTORY['storages']['storage_1'])
+    assert compact_snapshot.read_storage(str(path), 'storage_2') == (42, INVENTORY['storages']['storage_2'])
+    assert compact_snapshot.read(str(path)) == INVENTORY
+
+def test_rejects_other_files():
+    with pytest.raises(ValueError):
+        compact_snapshot.decode(b'{"storages": {}}')
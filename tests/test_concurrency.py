@@ -0,0 +1,113 @@
+# test_concurrency.py - concurrent writers on the JSON backend: no lost adds, journal replay after
+# compaction, stale edits merged or rejected, load failures logged, and a scan-only process
+# watched without loading the inventory
+import json
+import multiprocessing
+import os
+
+from conftest import load_app
+
+WRITERS = 4
+ADDS_PER_WRITER = 40
+
+def make_item(name):
+    return {'id': f'item_{name}', 'name': name, 'count': 1, 'unit': 'units', 'min_stock': 0,
+            'category': 'Tools', 'status': 'Available'}
+
+def add_items(directory, writer, count):
+    """One server process adding items - compacting often, so folds race with the appends"""
+    os.chdir(directory)
+    app = load_app('json')
+    app.JOURNAL_COMPACT_THRESHOLD = 10
+    for number in range(count):
+        if not app.commit_change('add_item', storage_id='storage_1', item=make_item(f'w{writer}-{number}')):
+            raise SystemExit(1)
+
+def item_names(data, storage_id='storage_1'):
+    return [item['name'] for item in data['storages'][storage_id]['items']]
+
+def test_concurrent_adds_are_not_lost(tmp_path, app):
+    seeded = len(item_names(app.get_backend(app.lab).load()[0]))
+    context = multiprocessing.get_context('spawn')
+    writers = [context.Process(target=add_items, args=(str(tmp_path), writer, ADDS_PER_WRITER))
+               for writer in range(WRITERS)]
+    for process in writers:
+        process.start()
+    for process in writers:
+        process.join(120)
+    assert [process.exitcode for process in writers] == [0] * WRITERS
+
+    names = item_names(app.JsonBackend(app.get_backend(app.lab).data_file).load()[0])
+    expected = {f'w{writer}-{number}' for writer in range(WRITERS) for number in range(ADDS_PER_WRITER)}
+    assert len(names) == seeded + len(expected)
+    assert expected <= set(names)
+
+def test_journal_replays_after_compaction(app):
+    backend = app.get_backend(app.lab)
+    store = app.get_inventory_store(app.lab)
+    backend.save(backend.load()[0])  # a snapshot up front, so no commit below starts a fold of its own
+    assert app.commit_change('add_item', storage_id='storage_1', item=make_item('before'))
+    reader = app.JsonBackend(backend.data_file)
+    data, cursor = reader.load()
+
+    backend.compact()
+    assert app.commit_change('add_item', storage_id='storage_1', item=make_item('after'))
+
+    with open(backend.data_file, encoding='utf-8') as f:
+        folded = json.load(f)
+    assert 'before' in item_names(folded) and 'after' not in item_names(folded)
+    with open(backend.journal_file, encoding='utf-8') as f:
+        journal = [json.loads(line) for line in f]
+    assert [entry['item']['name'] for entry in journal if entry['op'] == 'add_item'] == ['after']
+    assert all(entry['seq'] > folded['journal_seq'] for entry in journal if entry['op'] != 'checkpoint')
+
+    # A reader from before the fold has to reload - then it sees both sides of it
+    assert reader.changes_since(cursor, data) is None
+    assert {'before', 'after'} <= set(item_names(reader.load()[0]))
+    app.refresh_inventory(store)
+    assert {'before', 'after'} <= set(item_names(store['data']))
+
+def test_stale_edit_is_merged_or_rejected(app):
+    store = app.get_inventory_store(app.lab)
+    app.refresh_inventory(store)
+    storage = store['data']['storages']['storage_1']
+    item = dict(storage['items'][0])
+    base = app.get_edit_base(storage, item)
+    edit = {'storage_id': 'storage_1', 'item_id': item['id']}
+
+    # Another device saves first
+    assert app.commit_change('update_item', base=base, changes={'status': 'Broken'}, **edit)
+    # A different field from the old form merges on top
+    assert app.commit_change('update_item', base=base, changes={'min_stock': 7}, **edit)
+    # The same field, changed differently, conflicts
+    assert not app.commit_change('update_item', base=base, changes={'status': 'In Use'}, **edit)
+
+    saved = next(entry for entry in store['data']['storages']['storage_1']['items'] if entry['id'] == item['id'])
+    assert saved['status'] == 'Broken' and saved['min_stock'] == 7
+
+def test_load_failure_is_logged(app, monkeypatch, caplog):
+    # The change watcher refreshes off the script thread, where st.error is not shown anywhere
+    backend = app.get_backend(app.lab)
+    store = app.get_inventory_store(app.lab)
+    store['data'] = None
+    monkeypatch.setattr(backend, 'load', lambda: (_ for _ in ()).throw(OSError('disk gone')))
+    app.refresh_inventory(store, backend)
+    assert 'Data loading error' in caplog.text and 'disk gone' in caplog.text
+    assert store['data'] is not None
+
+def test_watcher_does_not_load_for_scans(app, monkeypatch):
+    # A cold process serving only storage scans - the watcher must not parse the inventory under the lock
+    backend = app.get_backend(app.lab)
+    store = app.get_inventory_store(app.lab)
+    store['data'] = None
+    notified = []
+    monkeypatch.setattr(app, 'notify_sessions', lambda store, storage_ids: notified.append(storage_ids))
+    watcher = app.ChangeWatcher.__new__(app.ChangeWatcher)  # poll by hand, without the thread
+    watcher.store, watcher.backend = store, backend
+    watcher.stamps = watcher.get_stamps()
+
+    watcher.poll()
+    assert store['data'] is None and notified == []
+    app.JsonBackend(backend.data_file).save(backend.load()[0])  # another process writes
+    watcher.poll()
+    assert store['data'] is None and notified == [None]
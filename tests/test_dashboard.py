@@ -0,0 +1,13 @@
+# test_dashboard.py - dashboard counters copied out of the shared store
+def test_reorder_list_keeps_only_the_most_urgent(app):
+    store = app.get_inventory_store(app.lab)
+    app.refresh_inventory(store)
+    items = [('storage_1', {'id': f'low_{n}', 'name': f'Low {n}', 'count': n % 7, 'unit': 'units', 'min_stock': 10,
+                            'category': 'Tools', 'status': 'Available'}) for n in range(100)]
+    assert app.commit_change('import_items', items=items, storages={})
+
+    stats = app.copy_dashboard_stats()
+    assert stats['low_stock_count'] == 100
+    assert len(stats['low_stock']) == app.REORDER_ITEMS_SHOWN
+    assert {item['count'] for _, item in stats['low_stock']} <= {0, 1}
+    assert {storage_name for storage_name, _ in stats['low_stock']} == {'Drone Storage Cabinet'}
@@ -0,0 +1,10 @@
+# test_import.py - import rows validated against the inventory
+def test_blank_count_is_a_row_error(app):
+    data = app.get_default_inventory()
+    rows = [(2, {'storage_id': 'storage_1', 'name': 'Gimbal', 'count': ''}),
+            (3, {'storage_id': 'storage_1', 'name': 'Props', 'count': '0'}),
+            (4, {'storage_id': 'storage_1', 'name': 'Ties', 'count': '1,500 pcs'})]
+    _, items, errors = app.build_import_batch(rows, data)
+    assert errors == [(2, "missing quantity")]
+    assert [(item['name'], item['count'], item['unit']) for _, item in items] == [('Props', 0, 'units'),
+                                                                                 ('Ties', 1500, 'pcs')]
@@ -0,0 +1,70 @@
+# test_ledger.py - status periods and the utilization report over a time range
+from ledger import Ledger
+
+def status(item_id, new, old=None, category='Drones'):
+    return {'item_id': item_id, 'name': item_id.title(), 'category': category, 'kind': 'status',
+            'old': old, 'new': new, 'status': new, 'storage_id': 'storage_1', 'user': None}
+
+def test_periods_are_clipped_to_the_range(tmp_path):
+    ledger = Ledger(str(tmp_path / 'ledger.db'))
+    ledger.record([status('drone', 'Available')], ts=100)
+    ledger.record([status('drone', 'In Use', 'Available')], ts=200)
+    ledger.record([status('drone', 'Available', 'In Use')], ts=300)
+
+    periods = sorted(ledger.periods(150, 400), key=lambda period: period[6])
+    assert [(period[3], period[6], period[7]) for period in periods] == [
+        ('Available', 150, 200), ('In Use', 200, 300), ('Available', 300, 400)]
+    assert [period[3] for period in ledger.periods(210, 290)] == ['In Use']
+    assert ledger.periods(0, 100) == []  # nothing had started yet
+
+def test_removed_items_stop_accruing_time(tmp_path):
+    ledger = Ledger(str(tmp_path / 'ledger.db'))
+    ledger.record([status('drone', 'Available'), status('wrench', 'Available', category='Tools')], ts=100)
+    ledger.record([dict(status('wrench', None, 'Available', category='Tools'), status=None)], ts=150)
+
+    assert ledger.utilization(100, 200) == {('Drones', 'Available'): (100, 1, 1), ('Tools', 'Available'): (50, 1, 1)}
+    assert ledger.periods(100, 200, item_id='wrench', status='Available')[0][6:] == (100, 150)
+
+def test_changes_recorded_out_of_order_keep_their_journal_order(tmp_path):
+    ledger = Ledger(str(tmp_path / 'ledger.db'))
+    ledger.record([status('drone', 'Available')], ts=100, seq=1)
+    # seq 3 reaches the ledger before seq 2 - both were committed, by different writers
+    ledger.record([status('drone', 'Broken', 'In Use')], ts=300, seq=3)
+    ledger.record([status('drone', 'In Use', 'Available')], ts=200, seq=2)
+
+    periods = sorted(ledger.periods(0, 400), key=lambda period: period[6])
+    assert [(period[3], period[6], period[7]) for period in periods] == [
+        ('Available', 100, 200), ('In Use', 200, 300), ('Broken', 300, 400)]
+
+def test_ledger_from_before_sequence_numbers_is_upgraded(tmp_path):
+    import sqlite3
+    path = str(tmp_path / 'ledger.db')
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE events (id INTEGER PRIMARY KEY, ts INTEGER NOT NULL, item_id TEXT NOT NULL, kind TEXT NOT NULL,
+                             old_value TEXT, new_value TEXT, storage_id TEXT, user TEXT);
+        CREATE TABLE periods (id INTEGER PRIMARY KEY, item_id TEXT NOT NULL, status TEXT NOT NULL, storage_id TEXT,
+                              user TEXT, start_ts INTEGER NOT NULL, end_ts INTEGER);
+        INSERT INTO events VALUES (1, 100, 'drone', 'status', NULL, 'Available', 'storage_1', NULL);
+        INSERT INTO periods VALUES (1, 'drone', 'Available', 'storage_1', NULL, 100, NULL);
+    """)
+    conn.commit()
+    conn.close()
+
+    ledger = Ledger(path)
+    ledger.record([status('drone', 'In Use', 'Available')], ts=200, seq=5)
+    assert sorted(period[3:4] + period[6:] for period in ledger.periods(0, 300)) == [
+        ('Available', 100, 200), ('In Use', 200, 300)]
+
+def test_history_is_recorded_outside_the_inventory_write_lock(app, monkeypatch):
+    backend = app.get_backend(app.lab)
+    ledger = app.get_ledger(app.lab)
+    held = []
+    record = ledger.record
+    monkeypatch.setattr(ledger, 'record', lambda *args: held.append(backend.lock_depth) or record(*args))
+
+    store = app.get_inventory_store(app.lab)
+    assert app.commit_change('update_item', storage_id='storage_1', item_id='item_1', changes={'status': 'Broken'})
+    assert held == [0]
+    rows = ledger.history(0, 2 ** 40, 'item_1')
+    assert rows[0][5] == 'Broken' and store['data']['journal_seq'] >= 1
@@ -0,0 +1,22 @@
+# test_quantities.py - free-text quantities parsed into count and unit
+import pytest
+
+@pytest.mark.parametrize('text, expected', [
+    ('1,500', (1500, 'units')),
+    ('1,500 pcs', (1500, 'pcs')),
+    ('1,234,567.5 m', (1234567.5, 'm')),
+    ('1.5', (1.5, 'units')),
+    ('1,5', (1.5, 'units')),
+    ('1,5000 g', (1.5, 'g')),
+    ('2 pcs', (2, 'pcs')),
+    ('Spare props', (1, 'Spare props')),
+])
+def test_parse_quantity(app, text, expected):
+    assert app.parse_quantity(text) == expected
+
+def test_parse_quantity_round_trips_displayed_counts(app):
+    for count in (7, 1500, 2_500_000, 2.5):
+        assert app.parse_quantity(app.format_quantity({'count': count, 'unit': 'pcs'})) == (count, 'pcs')
+
+def test_legacy_quantity_with_thousands(app):
+    assert app.migrate_item({'id': 'item_1', 'quantity': '1,500 pcs'}) == {'id': 'item_1', 'count': 1500, 'unit': 'pcs'}